@@ -1,7 +1,7 @@
 import streamlit as st
-import importlib
 import sys
 import os
+import re
 import logging
 
 # Добавляем путь к каталогу с проектом, чтобы можно было импортировать модули
@@ -17,40 +17,36 @@ tornado_loggers = [
     "tornado.iostream"
 ]
 
+# Сообщения об ошибках WebSocket, которые нужно подавлять (шаблон компилируется один раз)
+websocket_error_pattern = re.compile(
+    r"WebSocketClosedError|Stream is closed|StreamClosedError|Task exception was never retrieved"
+)
+
 # Подавляем ошибки WebSocketClosedError
 class WebSocketErrorFilter(logging.Filter):
     def filter(self, record):
-        # Фильтруем сообщения об ошибках WebSocket
-        message = str(record.getMessage())
-        if any(keyword in message for keyword in [
-            "WebSocketClosedError",
-            "Stream is closed",
-            "StreamClosedError",
-            "Task exception was never retrieved"
-        ]):
+        # Сначала проверяем шаблон сообщения, не подставляя аргументы
+        message = record.msg if isinstance(record.msg, str) else str(record.msg)
+        if websocket_error_pattern.search(message):
             return False
         # Фильтруем по имени исключения
         if record.exc_info:
             exc_type = record.exc_info[0]
             if exc_type and "WebSocketClosedError" in str(exc_type):
                 return False
+        # Форматируем сообщение с аргументами, только если в шаблоне ничего не нашлось
+        if record.args and websocket_error_pattern.search(record.getMessage()):
+            return False
         return True
 
-# Применяем фильтр и настраиваем уровень логирования
+# Применяем фильтр и настраиваем уровень логирования один раз на процесс.
+# Скрипт выполняется заново при каждом действии пользователя, поэтому проверяем,
+# что фильтр уже установлен; обработчики логгеров не пересоздаем
 for logger_name in tornado_loggers:
     logger = logging.getLogger(logger_name)
     logger.setLevel(logging.ERROR)
-    logger.addFilter(WebSocketErrorFilter())
-    
-    # Удаляем все существующие обработчики и добавляем новый с фильтром
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
-    
-    # Создаем новый обработчик с фильтром
-    handler = logging.StreamHandler()
-    handler.setLevel(logging.ERROR)
-    handler.addFilter(WebSocketErrorFilter())
-    logger.addHandler(handler)
+    if not any(type(f).__name__ == 'WebSocketErrorFilter' for f in logger.filters):
+        logger.addFilter(WebSocketErrorFilter())
 
 # Настройки страницы
 st.set_page_config(
@@ -104,7 +100,6 @@ hide_menu_style = """
         }
     </style>
 """
-st.markdown(hide_menu_style, unsafe_allow_html=True)
 
 # Основная точка входа
 if "logged_in" not in st.session_state:
@@ -114,42 +109,42 @@ if "logged_in" not in st.session_state:
 if "sidebar_state" not in st.session_state:
     st.session_state.sidebar_state = False
 
+# Стили сайдбара для авторизованных и неавторизованных пользователей
+sidebar_visible_style = """
+    <style>
+    /* Показываем сайдбар */
+    section[data-testid="stSidebar"] {
+        display: flex !important;
+        width: 250px !important;
+    }
+    </style>
+"""
+sidebar_hidden_style = """
+    <style>
+    /* Скрываем сайдбар полностью */
+    section[data-testid="stSidebar"] {
+        display: none !important;
+    }
+    </style>
+"""
+
 # Функция для отображения/скрытия сайдбара
 def toggle_sidebar():
+    """
+    Обновляет состояние сайдбара и возвращает CSS для него
+    (CSS выводится вместе с остальными стилями одним вызовом st.markdown)
+    """
     if st.session_state.logged_in:
         # Показываем сайдбар, только если пользователь авторизован
         st.session_state.sidebar_state = True
-        # Это хак, вставляющий CSS для показа сайдбара
-        st.markdown(
-            """
-            <style>
-            /* Показываем сайдбар */
-            section[data-testid="stSidebar"] {
-                display: flex !important;
-                width: 250px !important;
-            }
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
+        return sidebar_visible_style
     else:
         # Скрываем сайдбар для неавторизованных пользователей
         st.session_state.sidebar_state = False
-        # Это хак, вставляющий CSS для скрытия сайдбара
-        st.markdown(
-            """
-            <style>
-            /* Скрываем сайдбар полностью */
-            section[data-testid="stSidebar"] {
-                display: none !important;
-            }
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
+        return sidebar_hidden_style
 
 # Применяем настройки сайдбара
-toggle_sidebar()
+sidebar_style = toggle_sidebar()
 
 # Добавим JavaScript для скрытия навигации в сайдбаре
 hide_sidebar_nav_script = """
@@ -182,7 +177,8 @@ hide_sidebar_nav_script = """
     setTimeout(hideNavElements, 1000);
 </script>
 """
-st.markdown(hide_sidebar_nav_script, unsafe_allow_html=True)
+# Выводим все стили и скрипт одним элементом, а не отдельным сообщением на каждый блок
+st.markdown(hide_menu_style + sidebar_style + hide_sidebar_nav_script, unsafe_allow_html=True)
 
 # Импортируем страницы напрямую
 if st.session_state.logged_in:
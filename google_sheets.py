@@ -1,53 +1,329 @@
-from google.oauth2.credentials import Credentials
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest, build_http
+import google_auth_httplib2
+import numpy as np
 import pandas as pd
+import streamlit as st
 from datetime import datetime
+import hashlib
+import os
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import random
+import re
 import time
-def load_sheet_to_df(spreadsheet_id: str, range_name: str, credentials_path: str) -> pd.DataFrame:
+import functools
+import json
+try:
+    # orjson необязателен: если он установлен, ответы зеркал разбираются быстрее
+    import orjson
+except ImportError:
+    orjson = None
+@functools.lru_cache(maxsize=4)
+def _get_credentials(credentials_path: str, scopes: tuple) -> service_account.Credentials:
     """
-    Загружает данные из Google Sheets в pandas DataFrame
+    Читает файл сервисного аккаунта и разбирает ключ один раз на процесс для каждой пары (файл, права)
     
     Args:
-        spreadsheet_id (str): ID таблицы (можно получить из URL)
-        range_name (str): Диапазон или название листа (например, 'Лист1' или 'Лист1!A1:D10')
         credentials_path (str): Путь к файлу с учетными данными сервисного аккаунта
+        scopes (tuple): Права доступа (кортеж, чтобы аргументы были хэшируемыми)
         
     Returns:
-        pd.DataFrame: DataFrame с данными из таблицы
+        service_account.Credentials: Учетные данные сервисного аккаунта
+    """
+    return service_account.Credentials.from_service_account_file(credentials_path, scopes=list(scopes))
+
+@functools.lru_cache(maxsize=8)
+def _build_service(credentials_path: str, api: str, version: str, scopes: tuple):
+    """
+    Создает сервис Google API один раз на процесс для каждого набора (файл учетных данных, API, права)
+    
+    Args:
+        credentials_path (str): Путь к файлу с учетными данными сервисного аккаунта
+        api (str): Название API (например, 'sheets' или 'drive')
+        version (str): Версия API (например, 'v4')
+        scopes (tuple): Права доступа (кортеж, чтобы аргументы были хэшируемыми)
+        
+    Returns:
+        Resource: Сервис для работы с указанным API
     """
-    # Загружаем учетные данные
-    credentials = service_account.Credentials.from_service_account_file(
-        credentials_path,
-        scopes=['https://www.googleapis.com/auth/spreadsheets.readonly']
+    credentials = _get_credentials(credentials_path, scopes)
+    
+    # Сервис общий для всех сессий и потоков, а httplib2.Http не потокобезопасен,
+    # поэтому каждый запрос получает собственное авторизованное соединение
+    # (build_http задает таймаут сокета, чтобы зависший запрос не блокировал сессию)
+    def build_request(http, *args, **kwargs):
+        return HttpRequest(google_auth_httplib2.AuthorizedHttp(credentials, http=build_http()), *args, **kwargs)
+    
+    # Используем встроенный discovery-документ, чтобы не делать лишний HTTP-запрос
+    return build(
+        api, version,
+        credentials=credentials,
+        requestBuilder=build_request,
+        cache_discovery=False,
+        static_discovery=True
     )
+
+def _get_sheets_service(credentials_path: str):
+    """
+    Возвращает общий сервис Google Sheets API
+    
+    Args:
+        credentials_path (str): Путь к файлу с учетными данными сервисного аккаунта
+        
+    Returns:
+        Resource: Сервис для работы с Google Sheets API
+    """
+    return _build_service(credentials_path, 'sheets', 'v4', ('https://www.googleapis.com/auth/spreadsheets.readonly',))
+
+def _values_to_df(values: list) -> pd.DataFrame:
+    """
+    Строит DataFrame из ответа Sheets API сразу по колонкам, без построчного разбора списка строк
+    
+    Args:
+        values (list): Строки листа, первая строка - заголовки
+        
+    Returns:
+        pd.DataFrame: DataFrame с данными листа (значения - строки или None)
+    """
+    header = values[0]
+    ncols = len(header)
+    # API не возвращает пустые ячейки в конце строки, поэтому короткие строки дополняем None
+    rows = [row + [None] * (ncols - len(row)) if len(row) < ncols else row[:ncols] for row in values[1:]]
+    columns = list(zip(*rows)) if rows else [()] * ncols
+    df = pd.DataFrame({i: np.array(column, dtype=object) for i, column in enumerate(columns)})
+    # Названия колонок задаем отдельно, чтобы не потерять повторяющиеся заголовки
+    df.columns = header
+    return df
+
+def fetch_sheets_to_dfs(spreadsheet_id: str, ranges: list, credentials_path: str) -> dict:
+    """
+    Загружает несколько диапазонов Google Sheets одним запросом batchGet (без кэша)
     
-    # Создаем сервис для работы с Google Sheets API
-    service = build('sheets', 'v4', credentials=credentials)
+    Args:
+        spreadsheet_id (str): ID таблицы (можно получить из URL)
+        ranges (list): Список диапазонов или названий листов (например, ['Лист1', 'Лист2!A1:D10'])
+        credentials_path (str): Путь к файлу с учетными данными сервисного аккаунта
+        
+    Returns:
+        dict: Словарь {диапазон: DataFrame с данными из этого диапазона}
+    """
+    # Получаем закэшированный сервис для работы с Google Sheets API
+    service = _get_sheets_service(credentials_path)
     
-    # Получаем данные
+    # Получаем данные всех диапазонов за один запрос
     sheet = service.spreadsheets()
-    result = sheet.values().get(
+    result = sheet.values().batchGet(
         spreadsheetId=spreadsheet_id,
-        range=range_name
+        ranges=list(ranges)
     ).execute()
     
-    # Преобразуем в DataFrame
-    values = result.get('values', [])
-    if not values:
+    # API возвращает диапазоны в том же порядке, в котором они запрошены.
+    # Пустой диапазон не должен ломать загрузку остальных, поэтому для него возвращаем пустой DataFrame
+    dfs = {}
+    for range_name, value_range in zip(ranges, result.get('valueRanges', [])):
+        values = value_range.get('values', [])
+        dfs[range_name] = _values_to_df(values) if values else pd.DataFrame()
+    return dfs
+
+def fetch_sheet_to_df(spreadsheet_id: str, range_name: str, credentials_path: str) -> pd.DataFrame:
+    """
+    Загружает данные из Google Sheets в pandas DataFrame напрямую из API (без кэша)
+    
+    Args:
+        spreadsheet_id (str): ID таблицы (можно получить из URL)
+        range_name (str): Диапазон или название листа (например, 'Лист1' или 'Лист1!A1:D10')
+        credentials_path (str): Путь к файлу с учетными данными сервисного аккаунта
+        
+    Returns:
+        pd.DataFrame: DataFrame с данными из таблицы
+    """
+    df = fetch_sheets_to_dfs(spreadsheet_id, [range_name], credentials_path)[range_name]
+    if df.columns.empty:
         raise ValueError('Данные не найдены в указанном диапазоне')
+    return df
+
+# Гео, для которых в листе есть колонки с позициями
+VALID_GEOS = ['RU', 'KZ', 'UA', 'CA', 'DE', 'AU', 'BR', 'PL', 'PT','CH', 'AT']
+# Колонки, которые использует filter_promo_data; остальные колонки листа при загрузке можно не хранить
+PROMO_COLUMNS = [
+    'Год', 'Старт промо', 'Завершение промо', 'Категория', 'Проект', 'Игра', 'Провайдер',
+    'Название категории', 'Позиция'
+] + VALID_GEOS
+# Колонки с датами промо в формате DD.MM.YYYY
+PROMO_DATE_COLUMNS = ['Старт промо', 'Завершение промо']
+# Колонки с небольшим числом повторяющихся значений, которые хранятся как category
+PROMO_CATEGORY_COLUMNS = ['Категория', 'Проект', 'Провайдер', 'Название категории']
+# Листы таблицы промо, которые загружаются одним запросом batchGet; все вызовы используют один набор,
+# чтобы попадать в общую запись кэша load_sheets_to_dfs
+PROMO_SHEET_RANGES = ['Сводный', 'логи']
+
+def _prepare_promo_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Приводит колонки с датами промо к datetime, колонку 'Год' к числу,
+    а категориальные колонки к типу category (сравнения идут по целочисленным кодам).
+    Обрабатываются только колонки, которые есть в листе, поэтому функцию можно применять к любому листу
+    
+    Args:
+        df (pd.DataFrame): Данные листа в исходном строковом виде
         
-    df = pd.DataFrame(values[1:], columns=values[0])
+    Returns:
+        pd.DataFrame: DataFrame с типизированными колонками
+    """
+    for column in PROMO_DATE_COLUMNS:
+        if column in df.columns:
+            # Невалидные даты станут NaT и отсеются при фильтрации как пустые
+            df[column] = pd.to_datetime(df[column], format='%d.%m.%Y', errors='coerce')
+    if 'Год' in df.columns:
+        # Невалидные значения станут NaN
+        df['Год'] = pd.to_numeric(df['Год'], errors='coerce')
+    for column in PROMO_CATEGORY_COLUMNS:
+        if column in df.columns:
+            # Пустые строки не должны становиться отдельной категорией
+            df[column] = df[column].mask(df[column] == '').astype('category')
     return df
 
-def filter_promo_data(df: pd.DataFrame, start_date: str, end_date: str, category: str, project: list, geo: str, subcategory: str = None, exact_start_date: bool = False, exact_end_date: bool = False) -> pd.DataFrame:
+# Каталог для хранения копий листов на диске между перезапусками приложения
+SHEETS_CACHE_DIR = '.cache'
+
+def _get_drive_service(credentials_path: str):
+    """
+    Возвращает общий сервис Google Drive API (используется только для метаданных файла)
+    
+    Args:
+        credentials_path (str): Путь к файлу с учетными данными сервисного аккаунта
+        
+    Returns:
+        Resource: Сервис для работы с Google Drive API
+    """
+    return _build_service(credentials_path, 'drive', 'v3', ('https://www.googleapis.com/auth/drive.metadata.readonly',))
+
+def _get_modified_time(spreadsheet_id: str, credentials_path: str):
+    """
+    Получает время последнего изменения таблицы, которое служит версией для дискового кэша
+    
+    Returns:
+        str: Время изменения в формате RFC 3339 или None, если получить его не удалось
+    """
+    try:
+        file_info = _get_drive_service(credentials_path).files().get(
+            fileId=spreadsheet_id,
+            fields='modifiedTime'
+        ).execute()
+        return file_info.get('modifiedTime')
+    except Exception as e:
+        print(f"Не удалось получить время изменения таблицы: {e}")
+        return None
+
+def _sheet_cache_prefix(spreadsheet_id: str, range_name: str) -> str:
+    range_hash = hashlib.md5(range_name.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(SHEETS_CACHE_DIR, f"{spreadsheet_id}_{range_hash}_")
+
+def _sheet_cache_path(spreadsheet_id: str, range_name: str, modified_time: str) -> str:
+    version = ''.join(ch for ch in modified_time if ch.isalnum())
+    return f"{_sheet_cache_prefix(spreadsheet_id, range_name)}{version}.parquet"
+
+def _save_sheet_cache(df: pd.DataFrame, spreadsheet_id: str, range_name: str, modified_time: str):
+    """
+    Сохраняет лист в parquet и удаляет копии этого же листа от предыдущих версий таблицы
+    """
+    path = _sheet_cache_path(spreadsheet_id, range_name, modified_time)
+    prefix = _sheet_cache_prefix(spreadsheet_id, range_name)
+    try:
+        os.makedirs(SHEETS_CACHE_DIR, exist_ok=True)
+        df.to_parquet(path, index=False, compression='zstd')
+        for name in os.listdir(SHEETS_CACHE_DIR):
+            old_path = os.path.join(SHEETS_CACHE_DIR, name)
+            if old_path.startswith(prefix) and old_path != path:
+                os.remove(old_path)
+    except Exception as e:
+        # Дисковый кэш необязателен: при ошибке просто работаем без него
+        print(f"Не удалось сохранить кэш листа {range_name}: {e}")
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_sheets_to_dfs(spreadsheet_id: str, ranges: list, credentials_path: str) -> dict:
+    """
+    Загружает несколько диапазонов Google Sheets одним запросом с кэшированием между перезапусками скрипта.
+    Листы также сохраняются на диск в parquet с привязкой к времени изменения таблицы,
+    поэтому после перезапуска приложения неизмененные данные читаются с диска, а не из API.
+    
+    Args:
+        spreadsheet_id (str): ID таблицы (можно получить из URL)
+        ranges (list): Список диапазонов или названий листов
+        credentials_path (str): Путь к файлу с учетными данными сервисного аккаунта
+        
+    Returns:
+        dict: Словарь {диапазон: DataFrame с данными из этого диапазона}
+    """
+    modified_time = _get_modified_time(spreadsheet_id, credentials_path)
+    if modified_time is None:
+        dfs = fetch_sheets_to_dfs(spreadsheet_id, ranges, credentials_path)
+    else:
+        # Читаем с диска листы, сохраненные для текущей версии таблицы
+        dfs = {}
+        for range_name in ranges:
+            path = _sheet_cache_path(spreadsheet_id, range_name, modified_time)
+            if os.path.exists(path):
+                try:
+                    dfs[range_name] = pd.read_parquet(path)
+                except Exception as e:
+                    print(f"Не удалось прочитать кэш листа {range_name}: {e}")
+        
+        # Недостающие листы загружаем из API одним запросом и сохраняем на диск
+        missing = [range_name for range_name in ranges if range_name not in dfs]
+        if missing:
+            fetched = fetch_sheets_to_dfs(spreadsheet_id, missing, credentials_path)
+            for range_name, df in fetched.items():
+                _save_sheet_cache(df, spreadsheet_id, range_name, modified_time)
+            dfs.update(fetched)
+    
+    # Приводим типы колонок промо один раз при загрузке, а не при каждой фильтрации
+    return {range_name: _prepare_promo_columns(dfs[range_name]) for range_name in ranges}
+
+def load_sheet_to_df(spreadsheet_id: str, range_name: str, credentials_path: str, usecols: list = None) -> pd.DataFrame:
+    """
+    Загружает данные из Google Sheets в pandas DataFrame. Кэширование выполняет load_sheets_to_dfs,
+    здесь только выбирается лист и нужные колонки
+    
+    Args:
+        spreadsheet_id (str): ID таблицы (можно получить из URL)
+        range_name (str): Диапазон или название листа (например, 'Лист1' или 'Лист1!A1:D10')
+        credentials_path (str): Путь к файлу с учетными данными сервисного аккаунта
+        usecols (list, optional): Колонки, которые нужно оставить (отсутствующие в листе пропускаются)
+        
+    Returns:
+        pd.DataFrame: DataFrame с данными из таблицы
+    """
+    df = load_sheets_to_dfs(spreadsheet_id, [range_name], credentials_path)[range_name]
+    if df.columns.empty:
+        raise ValueError('Данные не найдены в указанном диапазоне')
+    if usecols is not None:
+        df = df[[column for column in usecols if column in df.columns]]
+    return df
+
+def _format_dates(dates: pd.Series) -> np.ndarray:
+    """
+    Форматирует даты в строки DD.MM.YYYY. Различных дат в промо немного,
+    поэтому strftime вызывается только для уникальных значений, а результат раскладывается по кодам
+    
+    Args:
+        dates (pd.Series): Колонка с датами без пропусков
+        
+    Returns:
+        np.ndarray: Массив строк в том же порядке, что и dates
+    """
+    codes, uniques = pd.factorize(dates)
+    return uniques.strftime('%d.%m.%Y').to_numpy(dtype=object)[codes]
+
+def filter_promo_data(df: pd.DataFrame, start_date: str, end_date: str, category: str, project: list, geo: str, subcategory: str = None, exact_start_date: bool = False, exact_end_date: bool = False, require_position: bool = False) -> pd.DataFrame:
     """
     Фильтрует DataFrame по периоду, категории и проекту
     
     Args:
-        df (pd.DataFrame): Исходный DataFrame
+        df (pd.DataFrame): Исходный DataFrame в виде, который возвращает load_sheet_to_df (даты промо уже в datetime),
+            с пустыми строками, замененными на NA. Не изменяется
         start_date (str): Начало периода в формате DD.MM.YYYY
         end_date (str): Конец периода в формате DD.MM.YYYY
         category (str): Название категории
@@ -56,20 +332,17 @@ def filter_promo_data(df: pd.DataFrame, start_date: str, end_date: str, category
         subcategory (str, optional): Название подкатегории (используется только если category='КАТЕГОРИЯ')
         exact_start_date (bool, optional): Если True, фильтрует записи где дата "Старт промо" точно равна start_date
         exact_end_date (bool, optional): Если True, фильтрует записи где дата "Завершение промо" точно равна end_date
+        require_position (bool, optional): Если True, отбрасывает записи без числовой позиции
         
     Returns:
         pd.DataFrame: Отфильтрованный DataFrame
     """
     # Проверяем валидность гео
-    valid_geos = ['RU', 'KZ', 'UA', 'CA', 'DE', 'AU', 'BR', 'PL', 'PT','CH', 'AT']
-    if geo not in valid_geos:
-        raise ValueError(f"Неверное значение geo. Допустимые значения: {', '.join(valid_geos)}")
+    if geo not in VALID_GEOS:
+        raise ValueError(f"Неверное значение geo. Допустимые значения: {', '.join(VALID_GEOS)}")
     
-    # Создаем копию DataFrame для безопасности
-    df = df.copy()
-    
-    # Заменяем None и пустые строки на NaN
-    df = df.replace({None: pd.NA, '': pd.NA})
+    # Исходный DataFrame не изменяем и не копируем: все условия собираются в маски,
+    # которые применяются к нему один раз в конце
     
     # Определяем колонки для проверки на пустые значения
     required_columns = ['Старт промо', 'Завершение промо', 'Категория', 'Проект', 'Игра', 'Провайдер']
@@ -78,26 +351,18 @@ def filter_promo_data(df: pd.DataFrame, start_date: str, end_date: str, category
             raise ValueError("Для категории 'КАТЕГОРИЯ' необходимо указать параметр subcategory")
         required_columns.append('Название категории')
     
-    # Удаляем строки с пустыми значениями в обязательных колонках
-    df = df.dropna(subset=required_columns)
+    # Отбрасываем строки с пустыми значениями в обязательных колонках
+    # (все маски собираем как массивы numpy, чтобы не тратить время на выравнивание индексов)
+    required_mask = df[required_columns].notna().all(axis=1).to_numpy()
     
-    # Удаляем строки с пустыми значениями в колонке 'Год' и преобразуем в числовой формат
+    # Отбрасываем строки с пустым годом и с 2024 годом и меньше (колонка уже числовая после загрузки, NaN > 2024 дает False)
     if 'Год' in df.columns:
-        # Преобразуем колонку 'Год' в числовой формат, невалидные значения станут NaN
-        df['Год'] = pd.to_numeric(df['Год'], errors='coerce')
-        # Удаляем строки с NaN в колонке 'Год'
-        df = df.dropna(subset=['Год'])
-        # Удаляем строки с 2024 годом и меньше
-        df = df[df['Год'] > 2024]
+        required_mask &= (df['Год'] > 2024).to_numpy()
     
-    # Конвертируем даты запроса
+    # Конвертируем даты запроса (даты промо уже преобразованы при загрузке)
     query_start = datetime.strptime(start_date, '%d.%m.%Y')
     query_end = datetime.strptime(end_date, '%d.%m.%Y')
     
-    # Конвертируем даты промо
-    df['Старт промо'] = pd.to_datetime(df['Старт промо'], format='%d.%m.%Y')
-    df['Завершение промо'] = pd.to_datetime(df['Завершение промо'], format='%d.%m.%Y')
-    
     # Фильтруем по периоду в зависимости от параметров exact_start_date и exact_end_date
     if exact_start_date and exact_end_date:
         # Обе кнопки активны: точное совпадение и начальной, и конечной даты
@@ -126,41 +391,50 @@ def filter_promo_data(df: pd.DataFrame, start_date: str, end_date: str, category
     
     # Создаем маску для проектов
     if project:  # Если список проектов не пустой
-        project_mask = df['Проект'].str.lower().str.contains('all')
-        
-        # Добавляем маски для каждого проекта из списка
-        for proj in project:
-            project_mask |= (
-                df['Проект'].str.contains(proj) |  # Точное совпадение
-                df['Проект'].str.contains(f"{proj},") |  # Проект в начале списка
-                df['Проект'].str.contains(f", {proj},") |  # Проект в середине списка
-                df['Проект'].str.contains(f", {proj}$")  # Проект в конце списка
-            )
+        # Одно регулярное выражение вместо отдельного прохода по колонке на каждый проект:
+        # 'all' либо любой из проектов как отдельный элемент списка через запятую
+        project_pattern = r'\ball\b|(?:^|,)\s*(?:' + '|'.join(map(re.escape, project)) + r')\s*(?:,|$)'
+        projects = df['Проект']
+        if isinstance(projects.dtype, pd.CategoricalDtype):
+            # Для категориальной колонки проверяем регуляркой только уникальные значения,
+            # а маску строк получаем выборкой по кодам (код -1 у пропусков попадает на последний False)
+            project_regex = re.compile(project_pattern, re.IGNORECASE)
+            categories = projects.cat.categories
+            lut = np.zeros(len(categories) + 1, dtype=bool)
+            lut[:-1] = [bool(project_regex.search(str(value))) for value in categories]
+            project_mask = lut[projects.cat.codes.to_numpy()]
+        else:
+            project_mask = projects.str.contains(project_pattern, case=False, regex=True, na=False).to_numpy()
     else:  # Если список проектов пустой, не фильтруем по проектам
-        project_mask = pd.Series([True] * len(df), index=df.index)
+        project_mask = True
+    
+    # Применяем все фильтры одним проходом: выбираем строки по позициям
+    final_mask = required_mask & date_mask.to_numpy() & category_mask.to_numpy() & project_mask
+    result_df = df.iloc[np.flatnonzero(final_mask)]
+    
+    # Определяем позицию в зависимости от категории и гео
+    position_column = 'Позиция' if category == 'КАТЕГОРИЯ' or category == 'НОВИНКИ' else geo
+    positions = pd.to_numeric(result_df[position_column], errors='coerce')
     
-    # Применяем все фильтры
-    result_df = df[date_mask & category_mask & project_mask].copy()
+    # Записи без позиции отбрасываем до формирования итогового датафрейма, чтобы не форматировать их даты
+    if require_position:
+        has_position = positions.notna().to_numpy()
+        result_df = result_df[has_position]
+        positions = positions[has_position]
     
     # Формируем итоговый датафрейм
     final_df = pd.DataFrame()
     final_df['Игра'] = result_df['Игра']
     final_df['Провайдер'] = result_df['Провайдер']
-    final_df['Период'] = result_df['Старт промо'].dt.strftime('%d.%m.%Y') + ' - ' + result_df['Завершение промо'].dt.strftime('%d.%m.%Y')
+    final_df['Период'] = _format_dates(result_df['Старт промо']) + ' - ' + _format_dates(result_df['Завершение промо'])
     final_df['Проекты'] = result_df['Проект']
     final_df['Категория'] = result_df['Категория']
-    
-    # Определяем позицию в зависимости от категории и гео
-    if category == 'КАТЕГОРИЯ' or category == 'НОВИНКИ':
-        final_df['Позиция'] = result_df['Позиция']
-    else:
-        final_df['Позиция'] = result_df[geo]
+    final_df['Позиция'] = positions
         
     # Переупорядочиваем колонки в нужном порядке
     final_df = final_df[['Позиция', 'Игра', 'Провайдер', 'Период', 'Проекты', 'Категория']]
     
     # Сортируем по позиции
-    final_df['Позиция'] = pd.to_numeric(final_df['Позиция'], errors='coerce')
     final_df = final_df.sort_values('Позиция')
     
     # Сбрасываем индекс и перемещаем его в конец
@@ -186,28 +460,59 @@ def search_game_by_nam_back(df: pd.DataFrame,project:str,geo:str) -> pd.DataFram
 }
     data_game = send_request(project,link_project)
     if data_game:
-        # Создаем новую колонку 'Игра на бэке'
-        def get_game_backend(game_name):
-            game_name_lower = game_name.lower().replace(' ', '').strip()
-            for key, value in data_game.items():
-                if key.lower().replace(' ', '').strip() == game_name_lower:
-                    return value.lower()
-            return '-'
-            
-        df.insert(1, 'id на бэке', df['Игра'].apply(get_game_backend))
+        # Нормализуем названия игр с бэка один раз (при совпадении берем первое, как и раньше)
+        backend_ids = {}
+        for key, value in data_game.items():
+            # Записи с пустым или нестроковым названием/идентификатором пропускаем, чтобы они не ломали весь поиск
+            if not isinstance(key, str) or not isinstance(value, str):
+                continue
+            backend_ids.setdefault(key.lower().replace(' ', '').strip(), value.lower())
+        
+        # Создаем новую колонку 'Игра на бэке' поиском по словарю вместо перебора всех игр для каждой строки
+        game_names = df['Игра'].str.lower().str.replace(' ', '', regex=False).str.strip()
+        df.insert(1, 'id на бэке', game_names.map(backend_ids).fillna('-'))
         return df
     else:
         return df
 mirror_cache = {}
 mirror_cache_timeout = 3600
+
+# Общая сессия с пулом keep-alive соединений для проверки зеркал между вызовами send_request
+_SESSION = requests.Session()
+_SESSION.proxies = {
+    'http': 'http://vpn@vpn548794202.opengw.net:1465',
+    'https': 'https://vpn@vpn548794202.opengw.net:1465'
+}
+_SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+
+# Разбор JSON из байтов ответа без промежуточного декодирования в строку
+_json_loads = orjson.loads if orjson is not None else json.loads
+def _probe_mirror(session: requests.Session, url: str, timeout: int):
+    """
+    Проверяет одно зеркало
+    
+    Returns:
+        requests.Response: Ответ зеркала, если оно вернуло 200, иначе None
+    """
+    try:
+        response = session.get(url, timeout=timeout)
+        if response.status_code == 200:
+            return response
+        # Возвращаем соединение в пул
+        response.close()
+    except requests.RequestException as e:
+        print(f"Ошибка при запросе к {url}: {e}")
+    return None
+
 def send_request(project,link_project):
     if project not in link_project:
         return []
     
     # Проверяем кэш
     current_time = time.time()
+    last_mirror = None
     if project in mirror_cache:
-        cache_time, mirror, result = mirror_cache[project]
+        cache_time, last_mirror, result = mirror_cache[project]
         if current_time - cache_time < mirror_cache_timeout:
             return result
     
@@ -231,28 +536,45 @@ def send_request(project,link_project):
     mirrors = list(mirror_range)
     random.shuffle(mirrors)
     
-    timeout = 3  # Таймаут в секундах
+    # Последнее рабочее зеркало проверяем первым: обычно оно все еще доступно
+    if last_mirror in mirrors:
+        mirrors.remove(last_mirror)
+        mirrors.insert(0, last_mirror)
     
-    for mirror in mirrors:
-        full_url = url_template.format(mirror=mirror)
-        try:
-            proxies = {
-                'http': 'http://vpn@vpn548794202.opengw.net:1465',
-                'https': 'https://vpn@vpn548794202.opengw.net:1465'
+    timeout = 3  # Таймаут в секундах
+    batch_size = 16  # Количество зеркал, проверяемых одновременно
+    
+    # Адреса зеркал формируем один раз
+    urls = {mirror: url_template.format(mirror=mirror) for mirror in mirrors}
+    
+    executor = ThreadPoolExecutor(max_workers=batch_size)
+    try:
+        # Проверяем зеркала пачками параллельно и берем первое ответившее
+        for i in range(0, len(mirrors), batch_size):
+            futures = {
+                executor.submit(_probe_mirror, _SESSION, urls[mirror], timeout): mirror
+                for mirror in mirrors[i:i + batch_size]
             }
-            response = requests.get(full_url, timeout=timeout, proxies=proxies)
-            
-            if response.status_code == 200:
-                json_data = response.json()
-                game_dict = {}
-                
-                for game_id, game_data in json_data.get('CmsApiCmsV2GamesRUB', {}).get('data', {}).items():
-                    game_dict[game_data.get('title')] = game_data.get('identifier')
-                return game_dict                 
-                
-        except (requests.RequestException, ValueError, KeyError) as e:
-            print(f"Ошибка при запросе к {full_url}: {e}")
-            continue
+            for future in as_completed(futures):
+                response = future.result()
+                if response is None:
+                    continue
+                try:
+                    json_data = _json_loads(response.content)
+                    games = json_data.get('CmsApiCmsV2GamesRUB', {}).get('data', {})
+                    game_dict = {
+                        game_data.get('title'): game_data.get('identifier')
+                        for game_data in games.values()
+                    }
+                    
+                    # Запоминаем результат и рабочее зеркало для следующих вызовов
+                    mirror_cache[project] = (time.time(), futures[future], game_dict)
+                    return game_dict
+                except (ValueError, KeyError) as e:
+                    print(f"Ошибка при разборе ответа {response.url}: {e}")
+    finally:
+        # Не ждем оставшиеся проверки: их результат уже не нужен
+        executor.shutdown(wait=False, cancel_futures=True)
     
     print(f"Не удалось найти рабочее зеркало для проекта {project}")
     return []
@@ -268,14 +590,26 @@ def get_logs_by_id(spreadsheet_id: str, credentials_path: str, date_column: str
     Returns:
         pd.DataFrame: DataFrame с логами, отсортированный по дате (убывание) и не старше 3 месяцев
     """
-    df_logs = load_sheet_to_df(spreadsheet_id, "логи", credentials_path)
-    
+    # Собственного кэша нет: лист берется из общей пакетной загрузки load_sheets_to_dfs
+    df_logs = load_sheets_to_dfs(spreadsheet_id, PROMO_SHEET_RANGES, credentials_path)['логи']
+    return filter_recent_logs(df_logs, date_column=date_column, limit=limit)
+
+def filter_recent_logs(df_logs: pd.DataFrame, date_column: str = "Дата", limit: int = None) -> pd.DataFrame:
+    """
+    Сортирует уже загруженные логи по дате (самые новые сверху) и оставляет только записи не старше 3 месяцев.
+    Args:
+        df_logs (pd.DataFrame): DataFrame с данными листа 'логи'
+        date_column (str): Название колонки с датой (по умолчанию 'Дата')
+        limit (int, optional): Ограничение количества записей для ускорения загрузки
+    Returns:
+        pd.DataFrame: DataFrame с логами, отсортированный по дате (убывание) и не старше 3 месяцев
+    """
     # Проверяем, что данные не пустые
     if df_logs.empty:
         return df_logs
     
     # Преобразуем столбец с датой к datetime для корректной сортировки и фильтрации
-    df_logs[date_column] = pd.to_datetime(df_logs[date_column], errors='coerce', dayfirst=True)
+    df_logs = df_logs.assign(**{date_column: pd.to_datetime(df_logs[date_column], errors='coerce', dayfirst=True)})
     
     # Удаляем строки с некорректными датами
     df_logs = df_logs.dropna(subset=[date_column])
@@ -294,14 +628,15 @@ def get_logs_by_id(spreadsheet_id: str, credentials_path: str, date_column: str
     df_logs = df_logs.reset_index(drop=True)
     return df_logs
 
-
 if __name__ == '__main__':
     SPREADSHEET_ID = '1m7TE_YFLtf2opgral3YVr7SeJk2BSh7YXuWtEUDUcNY'
     RANGE_NAME = 'Сводный'
     CREDENTIALS_PATH = 'credentials.json'
     
     # Загружаем данные
-    df = load_sheet_to_df(SPREADSHEET_ID, RANGE_NAME, CREDENTIALS_PATH)
+    df = load_sheet_to_df(SPREADSHEET_ID, RANGE_NAME, CREDENTIALS_PATH, usecols=PROMO_COLUMNS)
+    # Заменяем None и пустые строки на NaN
+    df = df.replace({None: pd.NA, '': pd.NA})
     
     # Фильтруем данные (пример)
     filtered_df = filter_promo_data(
@@ -1,10 +1,155 @@
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from google_sheets import _build_service
+import atexit
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import json
 import os
+import tempfile
 import hashlib
+import logging
+import xlsxwriter
+
+# Ход проверок пишем в лог модуля (время добавляет форматтер обработчика), ошибки по-прежнему выводим через print
+logger = logging.getLogger(__name__)
+
+# Права на чтение файла и его ревизий в Google Drive
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+# Соответствие полей ревизии Drive (после json_normalize) колонкам истории изменений
+REVISION_COLUMNS = {
+    'id': 'revision_id',
+    'modifiedTime': 'modified_time',
+    'lastModifyingUser_displayName': 'user_name',
+    'lastModifyingUser_emailAddress': 'user_email',
+    'size': 'size_bytes'
+}
+# Сколько последних записей хранить в истории изменений и в детальной истории
+MAX_CHANGES = 100
+MAX_DETAILED_CHANGES = 50
+# Суффикс файла со снимком последних данных для детального отслеживания изменений
+SNAPSHOT_SUFFIX = '.snapshot.parquet'
+
+# Файлы истории записываются фоновым потоком; до записи последняя версия каждого файла хранится в памяти
+_write_queue = queue.Queue()
+_pending_writes = {}
+_pending_lock = threading.Lock()
+# Запись файлов на диск (фоновым потоком и при завершении процесса) идет строго по одной
+_file_write_lock = threading.Lock()
+_writer_thread = None
+# umask процесса читаем один раз при импорте (os.umask нельзя безопасно вызывать из нескольких потоков)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _get_drive_service(credentials_path: str):
+    """
+    Возвращает общий сервис Google Drive API для файла учетных данных
+    
+    Args:
+        credentials_path (str): Путь к файлу с учетными данными
+        
+    Returns:
+        Resource: Сервис для работы с Google Drive API
+    """
+    return _build_service(credentials_path, 'drive', 'v3', tuple(DRIVE_SCOPES))
+
+def _load_history(tracking_file: str) -> dict:
+    """
+    Читает файл истории; если для него есть еще не записанная версия, возвращает ее
+    
+    Args:
+        tracking_file (str): Файл истории изменений
+        
+    Returns:
+        dict: Содержимое истории
+        
+    Raises:
+        FileNotFoundError: Если файла нет и записи в очереди тоже нет
+    """
+    with _pending_lock:
+        payload = _pending_writes.get(tracking_file)
+    if payload is None:
+        with open(tracking_file, 'rb') as f:
+            payload = f.read()
+    return json.loads(payload)
+
+def _save_history(history: dict, tracking_file: str):
+    """
+    Сериализует историю и ставит ее в очередь на запись фоновому потоку.
+    Несколько сохранений одного файла подряд схлопываются: на диск попадает только последнее
+    
+    Args:
+        history (dict): Содержимое истории
+        tracking_file (str): Файл истории изменений
+    """
+    global _writer_thread
+    payload = json.dumps(history, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    with _pending_lock:
+        _pending_writes[tracking_file] = payload
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer_loop, name='history-writer', daemon=True)
+            _writer_thread.start()
+    _write_queue.put(tracking_file)
+
+def _new_temp_file(target_file: str):
+    """
+    Создает уникальный временный файл рядом с целевым с правами, которые будут у целевого файла после замены:
+    как у существующего файла, а для нового - как у обычного файла с учетом umask (mkstemp создает файл с правами 0600)
+    
+    Args:
+        target_file (str): Файл, который будет заменен временным через os.replace
+        
+    Returns:
+        tuple: (дескриптор открытого временного файла, путь к нему)
+    """
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target_file)), suffix='.tmp')
+    try:
+        mode = os.stat(target_file).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(temp_file, mode)
+    return fd, temp_file
+
+def _write_pending(tracking_file: str):
+    """
+    Атомарно записывает последнюю версию истории из очереди: в уникальный временный файл, затем замена.
+    Фоновый поток и сброс при завершении процесса не пишут одновременно
+    """
+    with _file_write_lock:
+        with _pending_lock:
+            payload = _pending_writes.get(tracking_file)
+        if payload is None:
+            # Эта версия уже записана предыдущей итерацией
+            return
+        temp_file = None
+        try:
+            fd, temp_file = _new_temp_file(tracking_file)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_file, tracking_file)
+        except Exception as e:
+            print(f"Ошибка при сохранении истории: {e}")
+            if temp_file is not None and os.path.exists(temp_file):
+                os.remove(temp_file)
+        with _pending_lock:
+            # Если за время записи пришла новая версия, она останется в очереди
+            if _pending_writes.get(tracking_file) is payload:
+                del _pending_writes[tracking_file]
+
+def _writer_loop():
+    while True:
+        _write_pending(_write_queue.get())
+
+@atexit.register
+def _flush_pending_writes():
+    # Дописываем то, что фоновый поток не успел сохранить до завершения процесса
+    with _pending_lock:
+        tracking_files = list(_pending_writes)
+    for tracking_file in tracking_files:
+        _write_pending(tracking_file)
 
 def get_sheet_revision_history(spreadsheet_id: str, credentials_path: str, max_revisions: int = 50) -> pd.DataFrame:
     """
@@ -18,40 +163,30 @@ def get_sheet_revision_history(spreadsheet_id: str, credentials_path: str, max_r
     Returns:
         pd.DataFrame: DataFrame с историей изменений
     """
-    # Загружаем учетные данные с расширенными правами
-    credentials = service_account.Credentials.from_service_account_file(
-        credentials_path,
-        scopes=[
-            'https://www.googleapis.com/auth/spreadsheets.readonly',
-            'https://www.googleapis.com/auth/drive.readonly'
-        ]
-    )
-    
-    # Создаем сервис для работы с Google Drive API
-    drive_service = build('drive', 'v3', credentials=credentials)
+    # Получаем закэшированный сервис для работы с Google Drive API
+    drive_service = _get_drive_service(credentials_path)
     
     try:
-        # Получаем список ревизий
-        revisions = drive_service.revisions().list(
+        # Получаем список ревизий только с нужными полями. Drive отдает ревизии от старых к новым,
+        # поэтому для последних max_revisions читаем все страницы (максимального размера)
+        revisions = []
+        request = drive_service.revisions().list(
             fileId=spreadsheet_id,
-            fields='revisions(id,modifiedTime,lastModifyingUser,size)'
-        ).execute()
-        
-        revision_list = []
-        for revision in revisions.get('revisions', []):
-            revision_data = {
-                'revision_id': revision.get('id'),
-                'modified_time': revision.get('modifiedTime'),
-                'user_name': revision.get('lastModifyingUser', {}).get('displayName', 'Неизвестно'),
-                'user_email': revision.get('lastModifyingUser', {}).get('emailAddress', 'Неизвестно'),
-                'size_bytes': revision.get('size', 0)
-            }
-            revision_list.append(revision_data)
+            pageSize=1000,
+            fields='nextPageToken,revisions(id,modifiedTime,lastModifyingUser(displayName,emailAddress),size)'
+        )
+        while request is not None:
+            response = request.execute()
+            revisions.extend(response.get('revisions', []))
+            request = drive_service.revisions().list_next(request, response)
         
-        # Преобразуем в DataFrame
-        df = pd.DataFrame(revision_list)
+        # Преобразуем в DataFrame, раскрывая вложенные поля пользователя в отдельные колонки
+        df = pd.json_normalize(revisions, sep='_')
         
         if not df.empty:
+            df = df.rename(columns=REVISION_COLUMNS).reindex(columns=list(REVISION_COLUMNS.values()))
+            df = df.fillna({'user_name': 'Неизвестно', 'user_email': 'Неизвестно', 'size_bytes': 0})
+            
             # Конвертируем время в читаемый формат
             df['modified_time'] = pd.to_datetime(df['modified_time'])
             df['modified_time_formatted'] = df['modified_time'].dt.strftime('%d.%m.%Y %H:%M:%S')
@@ -68,6 +203,24 @@ def get_sheet_revision_history(spreadsheet_id: str, credentials_path: str, max_r
         print(f"Ошибка при получении истории изменений: {e}")
         return pd.DataFrame()
 
+def _hash_dataframe(df: pd.DataFrame) -> str:
+    """
+    Считает хэш содержимого DataFrame (заголовки и значения) без преобразования в CSV
+    
+    Args:
+        df (pd.DataFrame): Данные
+        
+    Returns:
+        str: Хэш в шестнадцатеричном виде
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    # Заголовки учитываем отдельно: хэши строк от названий колонок не зависят
+    hasher.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    # Массив хэшей строк передаем напрямую через буферный протокол, без копии в bytes
+    row_hashes = np.ascontiguousarray(pd.util.hash_pandas_object(df, index=False).to_numpy())
+    hasher.update(row_hashes)
+    return hasher.hexdigest()
+
 def track_data_changes(spreadsheet_id: str, range_name: str, credentials_path: str, tracking_file: str = 'changes_log.json') -> dict:
     """
     Отслеживает изменения в данных путем сравнения с предыдущим состоянием
@@ -81,21 +234,20 @@ def track_data_changes(spreadsheet_id: str, range_name: str, credentials_path: s
     Returns:
         dict: Информация об изменениях
     """
-    from google_sheets import load_sheet_to_df
+    from google_sheets import fetch_sheet_to_df
     
     try:
         # Принудительно загружаем СВЕЖИЕ данные (без кэша)
-        current_data = load_sheet_to_df(spreadsheet_id, range_name, credentials_path)
+        current_data = fetch_sheet_to_df(spreadsheet_id, range_name, credentials_path)
         
         # Очищаем данные для более надежного сравнения
-        current_data = current_data.replace({None: '', pd.NA: ''}).fillna('')
+        current_data = current_data.fillna('')
         
         # Создаем стабильный хэш на основе содержимого
-        current_content = current_data.to_csv(index=False)
-        current_hash = hashlib.md5(current_content.encode('utf-8')).hexdigest()
+        current_hash = _hash_dataframe(current_data)
         
-        print(f"Загружено строк: {len(current_data)}")
-        print(f"Текущий хэш: {current_hash}")
+        logger.info("Загружено строк: %d", len(current_data))
+        logger.info("Текущий хэш: %s", current_hash)
         
     except Exception as e:
         print(f"Ошибка при загрузке данных: {e}")
@@ -108,52 +260,51 @@ def track_data_changes(spreadsheet_id: str, range_name: str, credentials_path: s
         }
     
     # Загружаем предыдущее состояние
-    if os.path.exists(tracking_file):
-        try:
-            with open(tracking_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-        except Exception as e:
-            print(f"Ошибка при чтении файла истории: {e}")
-            history = {'changes': []}
-    else:
+    try:
+        history = _load_history(tracking_file)
+    except FileNotFoundError:
+        history = {'changes': []}
+    except Exception as e:
+        print(f"Ошибка при чтении файла истории: {e}")
         history = {'changes': []}
     
     # Получаем последний хэш
     last_hash = history.get('last_hash', None)
-    print(f"Предыдущий хэш: {last_hash}")
+    logger.info("Предыдущий хэш: %s", last_hash)
     
     has_changes = current_hash != last_hash
-    print(f"Обнаружены изменения: {has_changes}")
+    logger.info("Обнаружены изменения: %s", has_changes)
     
+    # Время в секундах эпохи сохраняем сразу, чтобы сводка не разбирала ISO-строки при каждом чтении
+    now = datetime.now()
     change_info = {
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': now.isoformat(),
         'has_changes': has_changes,
         'current_hash': current_hash,
         'previous_hash': last_hash,
         'rows_count': len(current_data),
-        'columns_count': len(current_data.columns)
+        'columns_count': len(current_data.columns),
+        'ts_epoch': now.timestamp()
     }
     
     # Если есть изменения, записываем их
     if has_changes:
-        print("Записываем изменения в историю...")
-        # Добавляем запись об изменении
-        history['changes'].append(change_info)
+        logger.info("Записываем изменения в историю...")
+        # Добавляем запись об изменении, ограничивая историю (старые записи вытесняются из deque)
+        changes = deque(history['changes'], maxlen=MAX_CHANGES)
+        changes.append(change_info)
+        history['changes'] = list(changes)
         history['last_hash'] = current_hash
         history['last_update'] = change_info['timestamp']
         
-        # Ограничиваем историю (оставляем последние 100 записей)
-        history['changes'] = history['changes'][-100:]
-        
-        # Сохраняем обновленную историю
+        # Сохраняем обновленную историю (запись на диск выполняет фоновый поток)
         try:
-            with open(tracking_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
-            print("История успешно сохранена")
+            _save_history(history, tracking_file)
+            logger.info("История поставлена в очередь на сохранение")
         except Exception as e:
             print(f"Ошибка при сохранении истории: {e}")
     else:
-        print("Изменений не обнаружено")
+        logger.info("Изменений не обнаружено")
     
     return change_info
 
@@ -169,14 +320,7 @@ def get_file_activity(spreadsheet_id: str, credentials_path: str, days_back: int
     Returns:
         pd.DataFrame: DataFrame с активностью файла
     """
-    credentials = service_account.Credentials.from_service_account_file(
-        credentials_path,
-        scopes=[
-            'https://www.googleapis.com/auth/drive.readonly'
-        ]
-    )
-    
-    drive_service = build('drive', 'v3', credentials=credentials)
+    drive_service = _get_drive_service(credentials_path)
     
     try:
         # Получаем общую информацию о файле
@@ -223,6 +367,24 @@ def get_file_activity(spreadsheet_id: str, credentials_path: str, days_back: int
         print(f"Ошибка при получении активности файла: {e}")
         return pd.DataFrame()
 
+def fetch_history_and_activity(spreadsheet_id: str, credentials_path: str, max_revisions: int = 50, days_back: int = 7) -> tuple:
+    """
+    Получает историю ревизий и активность файла параллельно, чтобы запросы к Drive API шли одновременно
+    
+    Args:
+        spreadsheet_id (str): ID таблицы
+        credentials_path (str): Путь к файлу с учетными данными
+        max_revisions (int): Максимальное количество ревизий для получения
+        days_back (int): Количество дней назад для анализа активности
+        
+    Returns:
+        tuple: (DataFrame с историей изменений, DataFrame с активностью файла)
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        revisions_future = executor.submit(get_sheet_revision_history, spreadsheet_id, credentials_path, max_revisions)
+        activity_future = executor.submit(get_file_activity, spreadsheet_id, credentials_path, days_back)
+        return revisions_future.result(), activity_future.result()
+
 def get_changes_summary(tracking_file: str = 'changes_log.json') -> dict:
     """
     Получает сводку по изменениям из файла истории
@@ -233,7 +395,9 @@ def get_changes_summary(tracking_file: str = 'changes_log.json') -> dict:
     Returns:
         dict: Сводка по изменениям
     """
-    if not os.path.exists(tracking_file):
+    try:
+        history = _load_history(tracking_file)
+    except FileNotFoundError:
         return {
             'total_changes': 0,
             'last_change': None,
@@ -241,9 +405,6 @@ def get_changes_summary(tracking_file: str = 'changes_log.json') -> dict:
             'changes_this_week': 0
         }
     
-    with open(tracking_file, 'r', encoding='utf-8') as f:
-        history = json.load(f)
-    
     changes = history.get('changes', [])
     
     if not changes:
@@ -259,15 +420,17 @@ def get_changes_summary(tracking_file: str = 'changes_log.json') -> dict:
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     week_start = today_start - timedelta(days=7)
     
-    changes_today = 0
-    changes_this_week = 0
-    
-    for change in changes:
-        change_time = datetime.fromisoformat(change['timestamp'])
-        if change_time >= today_start:
-            changes_today += 1
-        if change_time >= week_start:
-            changes_this_week += 1
+    # Для записей, сохраненных до появления ts_epoch, время разбираем из timestamp
+    change_times = np.fromiter(
+        (
+            change['ts_epoch'] if 'ts_epoch' in change else datetime.fromisoformat(change['timestamp']).timestamp()
+            for change in changes
+        ),
+        dtype=np.float64,
+        count=len(changes)
+    )
+    changes_today = int((change_times >= today_start.timestamp()).sum())
+    changes_this_week = int((change_times >= week_start.timestamp()).sum())
     
     return {
         'total_changes': len(changes),
@@ -292,26 +455,23 @@ def compare_sheet_versions(spreadsheet_id: str, credentials_path: str, revision_
         dict: Словарь с результатами сравнения
     """
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_path,
-            scopes=[
-                'https://www.googleapis.com/auth/spreadsheets.readonly',
-                'https://www.googleapis.com/auth/drive.readonly'
-            ]
-        )
+        drive_service = _get_drive_service(credentials_path)
         
-        drive_service = build('drive', 'v3', credentials=credentials)
+        # Получаем информацию об обеих ревизиях одним пакетным запросом
+        responses = {}
         
-        # Получаем информацию о ревизиях
-        revision_1 = drive_service.revisions().get(
-            fileId=spreadsheet_id,
-            revisionId=revision_id_1
-        ).execute()
+        def collect_response(request_id, response, exception):
+            if exception is not None:
+                raise exception
+            responses[request_id] = response
         
-        revision_2 = drive_service.revisions().get(
-            fileId=spreadsheet_id,
-            revisionId=revision_id_2
-        ).execute()
+        batch = drive_service.new_batch_http_request(callback=collect_response)
+        batch.add(drive_service.revisions().get(fileId=spreadsheet_id, revisionId=revision_id_1), request_id='revision_1')
+        batch.add(drive_service.revisions().get(fileId=spreadsheet_id, revisionId=revision_id_2), request_id='revision_2')
+        batch.execute()
+        
+        revision_1 = responses['revision_1']
+        revision_2 = responses['revision_2']
         
         comparison = {
             'revision_1': {
@@ -333,22 +493,27 @@ def compare_sheet_versions(spreadsheet_id: str, credentials_path: str, revision_
         print(f"Ошибка при сравнении версий: {e}")
         return {} 
 
-def get_detailed_row_changes(old_df: pd.DataFrame, new_df: pd.DataFrame) -> dict:
+def _build_row_keys(df: pd.DataFrame, key_columns: list) -> pd.Series:
     """
-    Детально сравнивает два DataFrame и находит конкретные изменения
+    Склеивает значения ключевых колонок через '||' построчно, по колонке за раз
     
     Args:
-        old_df (pd.DataFrame): Предыдущее состояние данных
-        new_df (pd.DataFrame): Текущее состояние данных
+        df (pd.DataFrame): Данные
+        key_columns (list): Колонки, из которых составляется ключ
         
     Returns:
-        dict: Детальная информация об изменениях
+        pd.Series: Ключи строк
     """
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] Начинаем сравнение данных...")
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] Старые данные: {len(old_df)} строк")
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] Новые данные: {len(new_df)} строк")
-    
-    changes = {
+    keys = df[key_columns[0]].astype(str)
+    for column in key_columns[1:]:
+        keys = keys.str.cat(df[column].astype(str), sep='||')
+    return keys
+
+def _empty_changes() -> dict:
+    """
+    Возвращает структуру детальных изменений без изменений
+    """
+    return {
         'added_rows': [],
         'deleted_rows': [],
         'modified_rows': [],
@@ -361,6 +526,23 @@ def get_detailed_row_changes(old_df: pd.DataFrame, new_df: pd.DataFrame) -> dict
             'cells_changed': 0
         }
     }
+
+def get_detailed_row_changes(old_df: pd.DataFrame, new_df: pd.DataFrame) -> dict:
+    """
+    Детально сравнивает два DataFrame и находит конкретные изменения
+    
+    Args:
+        old_df (pd.DataFrame): Предыдущее состояние данных
+        new_df (pd.DataFrame): Текущее состояние данных
+        
+    Returns:
+        dict: Детальная информация об изменениях
+    """
+    logger.info("Начинаем сравнение данных...")
+    logger.info("Старые данные: %d строк", len(old_df))
+    logger.info("Новые данные: %d строк", len(new_df))
+    
+    changes = _empty_changes()
     
     # Если DataFrame'ы пустые
     if old_df.empty and new_df.empty:
@@ -384,70 +566,71 @@ def get_detailed_row_changes(old_df: pd.DataFrame, new_df: pd.DataFrame) -> dict
         if col in old_df.columns and col in new_df.columns:
             key_columns.append(col)
     
-    if not key_columns:
+    # Ключи строк храним отдельно, не добавляя служебные колонки в переданные DataFrame
+    if key_columns:
+        old_keys = _build_row_keys(old_df, key_columns)
+        new_keys = _build_row_keys(new_df, key_columns)
+    else:
         # Если нет подходящих колонок, используем индекс
-        old_df['_row_key'] = old_df.index
-        new_df['_row_key'] = new_df.index
-        key_columns = ['_row_key']
-    
-    # Создаем ключи для строк
-    old_df['_composite_key'] = old_df[key_columns].astype(str).agg('||'.join, axis=1)
-    new_df['_composite_key'] = new_df[key_columns].astype(str).agg('||'.join, axis=1)
-    
-    old_keys = set(old_df['_composite_key'])
-    new_keys = set(new_df['_composite_key'])
-    
-    # Найдем добавленные строки
-    added_keys = new_keys - old_keys
-    for key in added_keys:
-        row_data = new_df[new_df['_composite_key'] == key].iloc[0].to_dict()
-        del row_data['_composite_key']  # Удаляем служебную колонку
-        changes['added_rows'].append({
-            'row_key': key,
-            'data': row_data
-        })
-    
-    # Найдем удаленные строки
-    deleted_keys = old_keys - new_keys
-    for key in deleted_keys:
-        row_data = old_df[old_df['_composite_key'] == key].iloc[0].to_dict()
-        del row_data['_composite_key']  # Удаляем служебную колонку
-        changes['deleted_rows'].append({
-            'row_key': key,
-            'data': row_data
-        })
-    
-    # Найдем измененные строки
-    common_keys = old_keys & new_keys
-    for key in common_keys:
-        old_row = old_df[old_df['_composite_key'] == key].iloc[0]
-        new_row = new_df[new_df['_composite_key'] == key].iloc[0]
-        
+        old_keys = old_df.index.astype(str)
+        new_keys = new_df.index.astype(str)
+    
+    # Индексируем строки по ключу один раз; для повторяющихся ключей берем первую строку
+    old_rows = old_df.set_index(pd.Index(old_keys))
+    old_rows = old_rows[~old_rows.index.duplicated()]
+    new_rows = new_df.set_index(pd.Index(new_keys))
+    new_rows = new_rows[~new_rows.index.duplicated()]
+    
+    added_keys = new_rows.index.difference(old_rows.index, sort=False)
+    deleted_keys = old_rows.index.difference(new_rows.index, sort=False)
+    common_keys = old_rows.index.intersection(new_rows.index, sort=False)
+    
+    # Найдем добавленные и удаленные строки: словари строк строим одним вызовом to_dict
+    changes['added_rows'] = [
+        {'row_key': key, 'data': row_data}
+        for key, row_data in zip(added_keys, new_rows.loc[added_keys].to_dict('records'))
+    ]
+    changes['deleted_rows'] = [
+        {'row_key': key, 'data': row_data}
+        for key, row_data in zip(deleted_keys, old_rows.loc[deleted_keys].to_dict('records'))
+    ]
+    
+    # Найдем измененные строки: сравниваем общие строки целиком по колонкам старых данных
+    old_common = old_rows.loc[common_keys]
+    new_common = new_rows.loc[common_keys]
+    old_values = old_common[old_df.columns]
+    new_values = new_common.reindex(columns=old_df.columns)
+    old_na = old_values.isna()
+    new_na = new_values.isna()
+    # Пустые значения с обеих сторон изменением не считаются
+    diff_mask = (~(old_na & new_na) & (old_na | new_na | (old_values != new_values))).to_numpy()
+    
+    # Словари формируем только для измененных ячеек: позиции берем одним проходом по маске
+    # (np.nonzero возвращает их по строкам, поэтому ячейки одной строки идут подряд)
+    row_positions, column_positions = np.nonzero(diff_mask)
+    changed_rows, row_starts = np.unique(row_positions, return_index=True)
+    old_array = old_values.to_numpy(dtype=object)
+    new_array = new_values.to_numpy(dtype=object)
+    
+    for position, row_columns in zip(changed_rows, np.split(column_positions, row_starts[1:])):
         cell_changes = []
-        for column in old_df.columns:
-            if column == '_composite_key':
-                continue
-            
-            old_value = old_row[column] if column in old_row else None
-            new_value = new_row[column] if column in new_row else None
-            
-            # Сравниваем значения (учитываем NaN)
-            if pd.isna(old_value) and pd.isna(new_value):
-                continue
-            elif pd.isna(old_value) or pd.isna(new_value) or old_value != new_value:
-                cell_changes.append({
-                    'column': column,
-                    'old_value': str(old_value) if not pd.isna(old_value) else None,
-                    'new_value': str(new_value) if not pd.isna(new_value) else None
-                })
-        
-        if cell_changes:
-            changes['modified_rows'].append({
-                'row_key': key,
-                'changes': cell_changes,
-                'old_data': {col: str(val) if not pd.isna(val) else None for col, val in old_row.items() if col != '_composite_key'},
-                'new_data': {col: str(val) if not pd.isna(val) else None for col, val in new_row.items() if col != '_composite_key'}
+        for column_position in row_columns:
+            old_value = old_array[position, column_position]
+            new_value = new_array[position, column_position]
+            cell_changes.append({
+                'column': old_values.columns[column_position],
+                'old_value': str(old_value) if not pd.isna(old_value) else None,
+                'new_value': str(new_value) if not pd.isna(new_value) else None
             })
+        
+        old_row = old_common.iloc[position]
+        new_row = new_common.iloc[position]
+        changes['modified_rows'].append({
+            'row_key': common_keys[position],
+            'changes': cell_changes,
+            'old_data': {col: str(val) if not pd.isna(val) else None for col, val in old_row.items()},
+            'new_data': {col: str(val) if not pd.isna(val) else None for col, val in new_row.items()}
+        })
     
     # Обновляем сводку
     changes['summary']['rows_added'] = len(changes['added_rows'])
@@ -462,6 +645,31 @@ def get_detailed_row_changes(old_df: pd.DataFrame, new_df: pd.DataFrame) -> dict
     
     return changes
 
+def _save_snapshot(df: pd.DataFrame, snapshot_file: str):
+    """
+    Атомарно записывает снимок данных в parquet: сначала в уникальный временный файл
+    (сессии могут сохранять снимок одновременно), затем заменяет старый снимок
+    
+    Args:
+        df (pd.DataFrame): Данные для сохранения
+        snapshot_file (str): Путь к файлу снимка
+        
+    Returns:
+        bool: True, если снимок сохранен
+    """
+    temp_file = None
+    try:
+        fd, temp_file = _new_temp_file(snapshot_file)
+        with os.fdopen(fd, 'wb') as f:
+            df.to_parquet(f, index=False)
+        os.replace(temp_file, snapshot_file)
+        return True
+    except Exception as e:
+        print(f"Ошибка при сохранении снимка данных: {e}")
+        if temp_file is not None and os.path.exists(temp_file):
+            os.remove(temp_file)
+        return False
+
 def track_detailed_changes(spreadsheet_id: str, range_name: str, credentials_path: str, 
                          tracking_file: str = 'detailed_changes_log.json') -> dict:
     """
@@ -476,36 +684,56 @@ def track_detailed_changes(spreadsheet_id: str, range_name: str, credentials_pat
     Returns:
         dict: Детальная информация об изменениях
     """
-    from google_sheets import load_sheet_to_df
+    from google_sheets import fetch_sheet_to_df
     
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] Начинаем проверку изменений...")
+    logger.info("Начинаем проверку изменений...")
     
     # Загружаем текущие данные (принудительно, без кэша)
-    current_data = load_sheet_to_df(spreadsheet_id, range_name, credentials_path)
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] Загружено строк: {len(current_data)}, колонок: {len(current_data.columns)}")
+    current_data = fetch_sheet_to_df(spreadsheet_id, range_name, credentials_path)
+    logger.info("Загружено строк: %d, колонок: %d", len(current_data), len(current_data.columns))
     
     # Очищаем данные для стабильного сравнения
-    current_data = current_data.replace({None: '', pd.NA: ''}).fillna('')
+    current_data = current_data.fillna('')
+    current_hash = _hash_dataframe(current_data)
     
     # Загружаем предыдущее состояние
-    if os.path.exists(tracking_file):
-        with open(tracking_file, 'r', encoding='utf-8') as f:
-            history = json.load(f)
-    else:
-        history = {'changes': [], 'last_data': None}
+    try:
+        history = _load_history(tracking_file)
+    except FileNotFoundError:
+        history = {'changes': []}
+    
+    # Данные совпадают с последним сохраненным снимком: ни снимок, ни детальное сравнение не нужны
+    if history.get('last_hash') == current_hash:
+        timestamp = datetime.now()
+        return {
+            'timestamp': timestamp.isoformat(),
+            'is_first_run': False,
+            'has_changes': False,
+            'rows_count': len(current_data),
+            'columns_count': len(current_data.columns),
+            'detailed_changes': _empty_changes(),
+            'ts_epoch': timestamp.timestamp()
+        }
     
-    # Получаем предыдущие данные
+    # Получаем предыдущие данные: из снимка parquet, а для старых файлов истории - из last_data
+    snapshot_file = tracking_file + SNAPSHOT_SUFFIX
     previous_data = None
-    if history.get('last_data'):
-        try:
-            previous_data = pd.DataFrame(history['last_data'])
-        except:
-            previous_data = None
+    try:
+        previous_data = pd.read_parquet(snapshot_file)
+    except FileNotFoundError:
+        if history.get('last_data'):
+            try:
+                previous_data = pd.DataFrame(history['last_data'])
+            except:
+                previous_data = None
+    except Exception as e:
+        print(f"Ошибка при чтении снимка данных: {e}")
     
+    now = datetime.now()
     # Если это первый запуск
     if previous_data is None:
         change_info = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now.isoformat(),
             'is_first_run': True,
             'has_changes': False,
             'rows_count': len(current_data),
@@ -517,27 +745,34 @@ def track_detailed_changes(spreadsheet_id: str, range_name: str, credentials_pat
         detailed_changes = get_detailed_row_changes(previous_data, current_data)
         
         change_info = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now.isoformat(),
             'is_first_run': False,
             'has_changes': detailed_changes['summary']['total_changes'] > 0,
             'rows_count': len(current_data),
             'columns_count': len(current_data.columns),
             'detailed_changes': detailed_changes
         }
+    change_info['ts_epoch'] = now.timestamp()
+    
+    # Хэш отличается от сохраненного (иначе сработал бы быстрый выход выше), поэтому снимок и хэш обновляем
+    # всегда - даже если построчное сравнение ничего не нашло (перестановка строк, пробелы, пустая колонка).
+    # Иначе last_hash не догонит данные и каждый следующий опрос снова будет делать полное сравнение.
+    # Текущие данные сохраняем отдельным снимком, в JSON остаются только метаданные
+    # (если снимок записать не удалось, данные остаются в JSON)
+    if _save_snapshot(current_data, snapshot_file):
+        history.pop('last_data', None)
+    else:
+        history['last_data'] = current_data.to_dict('records')
+    history['last_hash'] = current_hash
     
-    # Сохраняем текущие данные для следующего сравнения
-    history['last_data'] = current_data.to_dict('records')
-    
-    # Если есть изменения, добавляем их в историю
+    # Если есть изменения, добавляем запись в историю, ограничивая ее (старые записи вытесняются из deque)
     if change_info['has_changes'] or change_info['is_first_run']:
-        history['changes'].append(change_info)
-        
-        # Ограничиваем историю (оставляем последние 50 записей)
-        history['changes'] = history['changes'][-50:]
-        
-        # Сохраняем обновленную историю
-        with open(tracking_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+        changes = deque(history['changes'], maxlen=MAX_DETAILED_CHANGES)
+        changes.append(change_info)
+        history['changes'] = list(changes)
+    
+    # Сохраняем обновленную историю (запись на диск выполняет фоновый поток)
+    _save_history(history, tracking_file)
     
     return change_info
 
@@ -552,17 +787,35 @@ def get_changes_history(tracking_file: str = 'detailed_changes_log.json', limit:
     Returns:
         list: Список изменений
     """
-    if not os.path.exists(tracking_file):
+    try:
+        history = _load_history(tracking_file)
+    except FileNotFoundError:
         return []
     
-    with open(tracking_file, 'r', encoding='utf-8') as f:
-        history = json.load(f)
-    
     changes = history.get('changes', [])
     
     # Возвращаем последние записи
     return changes[-limit:] if changes else []
 
+def _write_records_sheet(workbook, sheet_name: str, records: list, header_format):
+    """
+    Записывает список словарей на новый лист построчно (заголовки - объединение ключей в порядке появления)
+    
+    Args:
+        workbook: Книга xlsxwriter
+        sheet_name (str): Название листа
+        records (list): Список словарей с данными строк
+        header_format: Формат ячеек заголовка
+    """
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, columns, header_format)
+    for row_number, record in enumerate(records, start=1):
+        worksheet.write_row(row_number, 0, [
+            None if pd.isna(value) else value
+            for value in (record.get(column) for column in columns)
+        ])
+
 def export_changes_to_excel(changes_data: dict, filename: str = None) -> str:
     """
     Экспортирует детальные изменения в Excel файл
@@ -578,27 +831,27 @@ def export_changes_to_excel(changes_data: dict, filename: str = None) -> str:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'detailed_changes_{timestamp}.xlsx'
     
-    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+    # Строки пишем сразу в файл (constant_memory), не собирая DataFrame для каждого листа
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    try:
         # Сводка изменений
         if changes_data.get('detailed_changes'):
-            summary = changes_data['detailed_changes']['summary']
-            summary_df = pd.DataFrame([summary])
-            summary_df.to_excel(writer, sheet_name='Сводка', index=False)
+            detailed_changes = changes_data['detailed_changes']
+            _write_records_sheet(workbook, 'Сводка', [detailed_changes['summary']], header_format)
             
             # Добавленные строки
-            if changes_data['detailed_changes']['added_rows']:
-                added_df = pd.DataFrame([row['data'] for row in changes_data['detailed_changes']['added_rows']])
-                added_df.to_excel(writer, sheet_name='Добавленные строки', index=False)
+            if detailed_changes['added_rows']:
+                _write_records_sheet(workbook, 'Добавленные строки', [row['data'] for row in detailed_changes['added_rows']], header_format)
             
             # Удаленные строки
-            if changes_data['detailed_changes']['deleted_rows']:
-                deleted_df = pd.DataFrame([row['data'] for row in changes_data['detailed_changes']['deleted_rows']])
-                deleted_df.to_excel(writer, sheet_name='Удаленные строки', index=False)
+            if detailed_changes['deleted_rows']:
+                _write_records_sheet(workbook, 'Удаленные строки', [row['data'] for row in detailed_changes['deleted_rows']], header_format)
             
             # Измененные строки
-            if changes_data['detailed_changes']['modified_rows']:
+            if detailed_changes['modified_rows']:
                 modified_data = []
-                for row in changes_data['detailed_changes']['modified_rows']:
+                for row in detailed_changes['modified_rows']:
                     for change in row['changes']:
                         modified_data.append({
                             'Ключ строки': row['row_key'],
@@ -608,7 +861,8 @@ def export_changes_to_excel(changes_data: dict, filename: str = None) -> str:
                         })
                 
                 if modified_data:
-                    modified_df = pd.DataFrame(modified_data)
-                    modified_df.to_excel(writer, sheet_name='Измененные ячейки', index=False)
+                    _write_records_sheet(workbook, 'Измененные ячейки', modified_data, header_format)
+    finally:
+        workbook.close()
     
-    return filename 
\ No newline at end of file
+    return filename
@@ -1,49 +1,64 @@
 import streamlit as st
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-import pandas as pd
+import hmac
+import time
+from google_sheets import fetch_sheet_to_df
 
 
 SPREADSHEET_ID = '1Ka9yKchuEQaqPIE1KpsGIT8Yf5IjjTTPkLckgnuoIQs'
 RANGE_NAME = 'main'
 CREDENTIALS_PATH = 'credentials.json'
+# Принудительно перечитывать таблицу пользователей можно не чаще одного раза за этот интервал (секунды)
+USERS_RELOAD_INTERVAL = 30
+_last_users_reload = float('-inf')
 # Проверка, авторизован ли пользователь
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 
-# Простая функция аутентификации (в реальности используйте хеширование!)
-def authenticate(username, password):
-    credentials = service_account.Credentials.from_service_account_file(
-        CREDENTIALS_PATH,
-        scopes=['https://www.googleapis.com/auth/spreadsheets.readonly']
-    )
-    
-    # Создаем сервис для работы с Google Sheets API
-    service = build('sheets', 'v4', credentials=credentials)
+@st.cache_data(ttl=60, show_spinner=False)
+def load_users() -> dict:
+    """
+    Загружает таблицу пользователей и кэширует ее на минуту, чтобы не ходить в API при каждой попытке входа
     
-    # Получаем данные
-    sheet = service.spreadsheets()
-    result = sheet.values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=RANGE_NAME
-    ).execute()
+    Returns:
+        dict: Словарь {логин: пароль или bcrypt-хэш пароля}
+    """
+    df = fetch_sheet_to_df(SPREADSHEET_ID, RANGE_NAME, CREDENTIALS_PATH)
+    # Для повторяющихся логинов, как и раньше, используется первая строка
+    df = df.drop_duplicates(subset='user')
+    return dict(zip(df['user'], df['password']))
+
+def check_password(password, stored_password) -> bool:
+    """
+    Сравнивает введенный пароль с сохраненным: bcrypt-хэши проверяются через bcrypt,
+    открытые пароли - сравнением за постоянное время
+    """
+    if stored_password is None:
+        return False
+    if stored_password.startswith(('$2a$', '$2b$', '$2y$')):
+        try:
+            import bcrypt
+        except ImportError:
+            st.error("Для проверки хэшированных паролей нужен пакет bcrypt")
+            return False
+        return bcrypt.checkpw(password.encode('utf-8'), stored_password.encode('utf-8'))
+    return hmac.compare_digest(password.encode('utf-8'), stored_password.encode('utf-8'))
+
+def authenticate(username, password):
+    global _last_users_reload
+    users = load_users()
+    # Новый пользователь мог появиться в таблице после загрузки кэша: перечитываем ее, но не чаще
+    # USERS_RELOAD_INTERVAL, чтобы попытки входа с неизвестными логинами не расходовали квоту Sheets API
+    if username not in users and time.monotonic() - _last_users_reload >= USERS_RELOAD_INTERVAL:
+        _last_users_reload = time.monotonic()
+        load_users.clear()
+        users = load_users()
     
-    # Преобразуем в DataFrame
-    values = result.get('values', [])
-    if not values:
-        raise ValueError('Данные не найдены в указанном диапазоне')
-        
-    df = pd.DataFrame(values[1:], columns=values[0])
-    print(df)
-    # Проверяем наличие пользователя в датафрейме
-    user_row = df[df['user'] == username]
-    if user_row.empty:
+    # Проверяем наличие пользователя в таблице
+    if username not in users:
         return False
         
-    # Получаем пароль из датафрейма и сравниваем
-    stored_password = user_row['password'].iloc[0]
-    return stored_password == password
+    # Получаем пароль из таблицы и сравниваем
+    return check_password(password, users[username])
 
 def show_auth_page():
     # Интерфейс формы
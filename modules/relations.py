@@ -1,71 +1,168 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from google_sheets import load_sheet_to_df, filter_promo_data, get_logs_by_id
+from google_sheets import load_sheets_to_dfs, filter_promo_data, filter_recent_logs, PROMO_COLUMNS, PROMO_SHEET_RANGES
 import io
+import difflib
 # Константы
 SPREADSHEET_ID = '1m7TE_YFLtf2opgral3YVr7SeJk2BSh7YXuWtEUDUcNY'
 RANGE_NAME = 'Сводный'
+LOGS_RANGE_NAME = 'логи'
+# Основной лист и логи загружаются одним запросом batchGet (общий набор листов с google_sheets)
+SHEET_RANGES = PROMO_SHEET_RANGES
 CREDENTIALS_PATH = 'credentials.json'
 VALID_GEOS = ['RU', 'KZ', 'UA', 'CA', 'DE', 'AU', 'BR', 'PL', 'PT','CH', 'AT' ]
 VALID_CATEGORIES = ['ГЛАВНАЯ','КАТЕГОРИЯ', 'НОВИНКИ']
+# Количество логов на одной странице вкладки логов
+LOGS_PAGE_SIZE = 50
+
+# CSS-стили собираются один раз при импорте модуля, а не заново на каждом перезапуске скрипта.
+# Выводить их все равно нужно при каждом перезапуске: Streamlit удаляет элементы, которые не были выведены повторно
+EXIT_BUTTON_STYLE = """
+<style>
+div[data-testid="stButton"] button {
+    background-color: #dc3545;
+    color: white;
+    border: none;
+    border-radius: 4px;
+    padding: 0.5rem 1rem;
+    width: 100%;
+    margin-top: 20px;
+}
+div[data-testid="stButton"] button:hover {
+    background-color: #c82333;
+    color: black;
+}
+div[data-testid="stButton"] button:active {
+    color: black;
+}
+</style>
+"""
+
+LOG_SCROLLBAR_STYLE = """
+<style>
+    /* Стили для красивого скроллбара таблиц */
+    .log-table-container::-webkit-scrollbar {
+        height: 12px;
+    }
+    .log-table-container::-webkit-scrollbar-track {
+        background: #f1f1f1;
+        border-radius: 10px;
+    }
+    .log-table-container::-webkit-scrollbar-thumb {
+        background: #888;
+        border-radius: 10px;
+    }
+    .log-table-container::-webkit-scrollbar-thumb:hover {
+        background: #555;
+    }
+    /* Для Firefox */
+    .log-table-container {
+        scrollbar-width: thin;
+        scrollbar-color: #888 #f1f1f1;
+    }
+</style>
+"""
 
 # Функция для получения уникальных значений из колонки с учетом разделителей
 def get_unique_values(df, column):
     if df[column].empty:
         return []
-    # Объединяем все значения в одну строку
-    all_values = ', '.join(df[column].dropna())
-    # Разбиваем по запятой и очищаем от пробелов
-    values = [x.strip() for x in all_values.split(',')]
+    # Разбиваем только уникальные значения: по запятой и очищаем от пробелов
+    values = df[column].dropna().drop_duplicates().astype(object)
+    parts = values.str.split(',').explode().str.strip()
     # Убираем дубликаты и пустые значения
-    return sorted(list(set(x for x in values if x)))
+    return sorted(parts[parts != ''].unique().tolist())
 
 # Функция для получения уникальных значений с обработкой None
 def get_unique_non_null_values(series):
     # Удаляем None и пустые значения, затем берем уникальные
-    return sorted([x for x in series.unique() if pd.notna(x) and x != ''])
+    values = series.dropna()
+    return sorted(values[values != ''].unique().tolist())
 
-# Кэшируем загрузку данных
-@st.cache_data(ttl=600)  # Кэш на 1 час
+# Кэшируем загрузку данных: cache_resource отдает один и тот же DataFrame без копирования на каждом
+# перезапуске, поэтому результат используется только для чтения (filter_promo_data его не изменяет)
+@st.cache_resource(ttl=600)  # Кэш на 10 минут
 def load_data():
     try:
-        df = load_sheet_to_df(SPREADSHEET_ID, RANGE_NAME, CREDENTIALS_PATH)
-        # Заменяем None и пустые строки на NaN
-        df = df.replace({None: pd.NA, '': pd.NA})
+        df = load_sheets_to_dfs(SPREADSHEET_ID, SHEET_RANGES, CREDENTIALS_PATH)[RANGE_NAME]
+        if df.columns.empty:
+            raise ValueError('Данные не найдены в указанном диапазоне')
+        # Оставляем только колонки, которые нужны для фильтрации
+        df = df[[column for column in PROMO_COLUMNS if column in df.columns]]
+        # Заменяем None и пустые строки на NA только в текстовых колонках: категории, числа и даты
+        # уже приведены при загрузке, поэтому обходить их значения через replace не нужно
+        text_columns = df.select_dtypes(include='object').columns
+        if len(text_columns):
+            text = df[text_columns]
+            df = df.assign(**text.where(text.notna() & text.ne(''), pd.NA))
         return df
     except Exception as e:
         st.error(f"Ошибка при загрузке данных: {str(e)}")
         return None
 
-# Загружаем логи (без автообновления, только по кнопке)
-def load_logs_data(limit: int = 500):
+# Кэшируем списки значений для фильтров, чтобы не пересчитывать их при каждом перезапуске скрипта
+@st.cache_data(ttl=600, show_spinner=False)
+def load_filter_options():
+    """
+    Собирает значения для фильтров вкладки размещения один раз на загрузку данных
+    Returns:
+        tuple: (подкатегории для категории 'КАТЕГОРИЯ', проекты)
     """
-    Загружает логи с ограничением количества для ускорения работы
+    df = load_data()
+    if df is None:
+        return [], []
+    subcategories = get_unique_non_null_values(df.loc[df['Категория'] == 'КАТЕГОРИЯ', 'Название категории'])
+    # Маска считается один раз за загрузку данных; по ней выбираем только колонку проектов, а не всю таблицу
+    projects = get_unique_values(df.loc[df['Категория'].isin(VALID_CATEGORIES), ['Проект']], 'Проект')
+    return subcategories, projects
+
+# Кэшируем логи и колонки основного листа; кнопка обновления сбрасывает кэш явно
+@st.cache_data(ttl=600, show_spinner=False)
+def load_logs_and_columns(limit: int = 500):
+    """
+    Загружает логи с ограничением количества и список названий колонок основного листа 'Сводный'
+    (для отображения логов изменений) из одного пакетного запроса batchGet
     Args:
-        limit: Максимальное количество записей для загрузки (по умолчанию 500)
+        limit: Максимальное количество записей логов для загрузки (по умолчанию 500)
+    Returns:
+        tuple: (DataFrame с логами, список колонок)
+        
+    Raises:
+        Exception: Ошибки загрузки не перехватываются, чтобы неудачный результат не попал в кэш
     """
-    try:
-        return get_logs_by_id(SPREADSHEET_ID, CREDENTIALS_PATH, limit=limit)
-    except Exception as e:
-        st.error(f"Ошибка при загрузке логов: {str(e)}")
-        return pd.DataFrame()
+    dfs = load_sheets_to_dfs(SPREADSHEET_ID, SHEET_RANGES, CREDENTIALS_PATH)
+    return filter_recent_logs(dfs[LOGS_RANGE_NAME], limit=limit), dfs[RANGE_NAME].columns.tolist()
 
-# Получаем список колонок из основного листа (без автообновления)
-@st.cache_data  # Кэш без TTL - обновляется только при явной очистке
-def get_column_names():
+# Кэшируем Excel-файл: для уже выгружавшейся выборки файл повторно не формируется
+@st.cache_data(max_entries=16, show_spinner=False)
+def to_excel_bytes(df: pd.DataFrame) -> bytes:
     """
-    Получает список названий колонок из основного листа 'Сводный'
-    для использования в отображении логов изменений
+    Формирует Excel-файл с результатами фильтрации
+    Args:
+        df: Отфильтрованные данные
+    Returns:
+        bytes: Содержимое xlsx-файла
     """
+    # xlsxwriter нужен только для выгрузки, поэтому импортируем его при первом формировании файла
+    import xlsxwriter
+    
+    buffer = io.BytesIO()
+    # Пишем строки напрямую через xlsxwriter в режиме constant_memory: pandas выводит ячейки по колонкам,
+    # а в этом режиме строки нужно записывать строго по порядку
+    workbook = xlsxwriter.Workbook(buffer, {'constant_memory': True, 'strings_to_urls': False})
     try:
-        df = load_sheet_to_df(SPREADSHEET_ID, RANGE_NAME, CREDENTIALS_PATH)
-        # Возвращаем список названий колонок
-        return df.columns.tolist()
-    except Exception:
-        # В случае ошибки возвращаем базовый список колонок
-        # (предупреждение будет показано в show_reports_tab)
-        return None
+        worksheet = workbook.add_worksheet('Результаты')
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        worksheet.write_row(0, 0, [str(column) for column in df.columns], header_format)
+        # Колонки переводим в списки значений Python (пропуски - пустые ячейки) один раз для всей таблицы
+        columns = [series.astype(object).where(series.notna(), None).tolist() for _, series in df.items()]
+        for row_number, values in enumerate(zip(*columns), start=1):
+            worksheet.write_row(row_number, 0, values)
+    finally:
+        workbook.close()
+    return buffer.getvalue()
 
 def show_page():
     # Проверка авторизации
@@ -89,27 +186,7 @@ def show_page():
         st.markdown("---")
         
         # Кнопка выхода в нижней части сайдбара с CSS-стилями
-        exit_button_style = """
-        <style>
-        div[data-testid="stButton"] button {
-            background-color: #dc3545;
-            color: white;
-            border: none;
-            border-radius: 4px;
-            padding: 0.5rem 1rem;
-            width: 100%;
-            margin-top: 20px;
-        }
-        div[data-testid="stButton"] button:hover {
-            background-color: #c82333;
-            color: black;
-        }
-        div[data-testid="stButton"] button:active {
-            color: black;
-        }
-        </style>
-        """
-        st.markdown(exit_button_style, unsafe_allow_html=True)
+        st.markdown(EXIT_BUTTON_STYLE, unsafe_allow_html=True)
         
         if st.button("🚪 Выйти из системы"):
             st.session_state.logged_in = False
@@ -132,31 +209,29 @@ def show_promo_tab():
     df = load_data()
 
     if df is not None:
+        # Значения для фильтров берем из кэша
+        subcategories, projects = load_filter_options()
+        
         # Создаем колонки для размещения фильтров
         col1, col2, col3 = st.columns(3)
         
         with col1:
             # Выбор категории
-            categories = get_unique_non_null_values(df['Категория'])
             category = st.selectbox('Выберите категорию', VALID_CATEGORIES)
             
             # Если выбрана КАТЕГОРИЯ, показываем выбор подкатегории
             subcategory = None
             if category == 'КАТЕГОРИЯ':
-                subcategories = get_unique_non_null_values(df[df['Категория'] == 'КАТЕГОРИЯ']['Название категории'])
                 subcategory = st.selectbox('Выберите подкатегорию', subcategories)
         
         with col2:
             # Выбор проектов (мультивыбор)
-            projects = get_unique_values(df[df['Категория'].isin(VALID_CATEGORIES)], 'Проект')
             selected_projects = st.multiselect(
                 'Выберите проекты',
                 options=projects,
                 help="Можно выбрать несколько проектов. Если ничего не выбрано, фильтрация по проектам не применяется"
             )
             
-            print(selected_projects)
-            
             # Выбор ГЕО
             geo = st.selectbox('Выберите ГЕО', VALID_GEOS)
         
@@ -176,15 +251,20 @@ def show_promo_tab():
                 help='Учитывать только записи с датой "Завершение промо" равной дате "Конец периода"'
             )
             
-            # По умолчанию устанавливаем текущий месяц
-            today = datetime.now()
+            # По умолчанию устанавливаем текущий месяц. Границы считаются один раз за сессию: значение по умолчанию
+            # входит в идентификатор виджета, и его смена при переходе через полночь сбросила бы выбранные даты
+            if 'default_period' not in st.session_state:
+                month_start = datetime.now().date().replace(day=1)
+                month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+                st.session_state.default_period = (month_start, month_end)
+            default_start, default_end = st.session_state.default_period
             start_date = st.date_input(
                 'Начало периода',
-                value=today.replace(day=1)
+                value=default_start
             )
             end_date = st.date_input(
                 'Конец периода',
-                value=(today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+                value=default_end
             )
         
         # Кнопка для применения фильтров
@@ -215,38 +295,33 @@ def show_promo_tab():
                         geo=geo,
                         subcategory=subcategory,
                         exact_start_date=filter_mode_start,
-                        exact_end_date=filter_mode_end
+                        exact_end_date=filter_mode_end,
+                        require_position=True  # Записи без позиции отбрасываются в общей маске фильтра
                     )
                     
                     # Показываем результаты
                     if not filtered_df.empty:
-                        # Удаляем строки с пустыми значениями в колонке Позиция
-                        filtered_df = filtered_df.dropna(subset=['Позиция'])
+                        # Без пропусков целые позиции передаем целочисленной колонкой: в Arrow она компактнее float
+                        positions = filtered_df['Позиция']
+                        if (positions % 1 == 0).all():
+                            filtered_df = filtered_df.assign(Позиция=positions.astype('int64'))
                         
-                        if not filtered_df.empty:
-                            st.write(f"Найдено записей: {len(filtered_df)}")
-                            st.dataframe(
-                                filtered_df,
-                                use_container_width=True,
-                                column_config={
-                                    "Позиция": st.column_config.NumberColumn(
-                                        "Позиция",
-                                        help="Позиция в выбранном ГЕО",
-                                        format="%d"
-                                    )
-                                }
-                            )
-                        else:
-                            st.warning('После удаления записей с пустыми позициями ничего не осталось')
-                        # Создаем буфер для Excel файла
-                        buffer = io.BytesIO()
-                        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                            filtered_df.to_excel(writer, index=False, sheet_name='Результаты')
-                            
+                        st.write(f"Найдено записей: {len(filtered_df)}")
+                        st.dataframe(
+                            filtered_df,
+                            use_container_width=True,
+                            column_config={
+                                "Позиция": st.column_config.NumberColumn(
+                                    "Позиция",
+                                    help="Позиция в выбранном ГЕО",
+                                    format="%d"
+                                )
+                            }
+                        )
                         # Кнопка для скачивания результатов
                         if st.download_button(
                             label="Скачать как Excel",
-                            data=buffer.getvalue(),
+                            data=to_excel_bytes(filtered_df),
                             file_name=f"promo_filter_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
                             mime="application/vnd.ms-excel"
                         ):
@@ -263,96 +338,39 @@ def show_reports_tab():
     st.title("Логи изменений (за последние 3 месяца)")
     
     # Добавляем глобальные стили для скроллбара
-    st.markdown("""
-    <style>
-        /* Стили для красивого скроллбара таблиц */
-        .log-table-container::-webkit-scrollbar {
-            height: 12px;
-        }
-        .log-table-container::-webkit-scrollbar-track {
-            background: #f1f1f1;
-            border-radius: 10px;
-        }
-        .log-table-container::-webkit-scrollbar-thumb {
-            background: #888;
-            border-radius: 10px;
-        }
-        .log-table-container::-webkit-scrollbar-thumb:hover {
-            background: #555;
-        }
-        /* Для Firefox */
-        .log-table-container {
-            scrollbar-width: thin;
-            scrollbar-color: #888 #f1f1f1;
-        }
-    </style>
-    """, unsafe_allow_html=True)
-    
-    # Инициализируем session_state для хранения данных
-    if 'logs_data' not in st.session_state:
-        st.session_state.logs_data = None
-    if 'column_names' not in st.session_state:
-        st.session_state.column_names = None
-    if 'logs_loading' not in st.session_state:
-        st.session_state.logs_loading = False
-    
-    # Загружаем данные при первой загрузке
-    if st.session_state.logs_data is None and not st.session_state.logs_loading:
-        st.session_state.logs_loading = True
-        with st.spinner('Загрузка логов...'):
-            try:
-                st.session_state.logs_data = load_logs_data()
-                st.session_state.column_names = get_column_names()
-            finally:
-                st.session_state.logs_loading = False
+    st.markdown(LOG_SCROLLBAR_STYLE, unsafe_allow_html=True)
     
     # Кнопка обновления
     col1, col2 = st.columns([1, 4])
     with col1:
         refresh = st.button('🔄 Обновить', use_container_width=True)
     
-    # Обновляем данные при нажатии кнопки
+    # При обновлении очищаем кэш загруженных листов и логов, чтобы данные перечитались из таблицы
     if refresh:
-        st.session_state.logs_loading = True
+        load_sheets_to_dfs.clear()
+        load_logs_and_columns.clear()
+    
+    try:
+        # Логи кэшируются между перезапусками и пользователями, повторно загружаются только после обновления или по ttl
         with st.spinner('Загрузка логов...'):
             try:
-                # Очищаем кэш колонок при обновлении
-                get_column_names.clear()
-                # Загружаем данные
-                st.session_state.logs_data = load_logs_data()
-                st.session_state.column_names = get_column_names()
-                st.success('✅ Логи обновлены!', icon="✅")
+                logs_df, base_cell_names = load_logs_and_columns()
             except Exception as e:
-                st.error(f"Ошибка при обновлении: {str(e)}")
-            finally:
-                st.session_state.logs_loading = False
-    
-    # Показываем сообщение, если данные еще загружаются
-    if st.session_state.logs_loading:
-        st.info("⏳ Загрузка данных...")
-        return
-    
-    try:
-        logs_df = st.session_state.logs_data
-        base_cell_names = st.session_state.column_names
-        
-        # Проверяем, что данные загружены
-        if logs_df is None:
-            st.info("Нажмите кнопку '🔄 Обновить' для загрузки логов")
-            return
+                # Ошибка не кэшируется: при следующем перезапуске загрузка будет повторена
+                st.error(f"Ошибка при загрузке логов: {str(e)}")
+                return
+        if refresh:
+            st.success('✅ Логи обновлены!', icon="✅")
             
         if logs_df.empty:
             st.warning("Нет логов за последние 3 месяца.")
             return
         
-        # Если не удалось загрузить колонки из документа, используем базовый список
-        if base_cell_names is None:
-            st.warning("Не удалось загрузить список колонок из документа. Используется базовый список.")
-            base_cell_names = [
-                'Год', 'Статус', 'Провайдер', 'Месяц', 'Проект', 'Размещение', 'Старт промо', 'Завершение промо',
-                'Игра', 'Категория', 'Позиция', 'Название категории', 'Скидка', 'ПФ (комп)', 'Период скидки',
-                'RU', 'KZ', 'UA', 'CA', 'DE', 'AU', 'BR', 'Гео', 'Комменатрии'
-            ]
+        # Выводим логи постранично: объем HTML и время отрисовки не зависят от количества логов
+        page_count = (len(logs_df) - 1) // LOGS_PAGE_SIZE + 1
+        if page_count > 1:
+            page = st.number_input(f'Страница (из {page_count})', min_value=1, max_value=page_count, value=1, step=1)
+            logs_df = logs_df.iloc[(page - 1) * LOGS_PAGE_SIZE:page * LOGS_PAGE_SIZE]
 
         card_bg = '#fff'
         card_border = '#d1d5db'
@@ -364,66 +382,100 @@ def show_reports_tab():
         old_bg = '#ffb3b3'
         new_bg = '#b3ffb3'
 
-        for idx, row in logs_df.iterrows():
-            date = row.get('Дата', '')
-            # Преобразуем дату к формату 'дд.мм.гггг чч:мм' если возможно
-            try:
-                date_obj = pd.to_datetime(date)
-                date = date_obj.strftime('%d.%m.%Y %H:%M')
-            except Exception:
-                pass
-            user = row.get('Пользователь', '')
-            cell = row.get('Ячейка', '')
-            old = str(row.get('Старое значение', ''))
-            new = str(row.get('Новое значение', ''))
+        # Разбиваем старые и новые значения всех логов на ячейки сразу: матрицы строк одинаковой ширины
+        old_values = logs_df['Старое значение'].astype(str) if 'Старое значение' in logs_df.columns else pd.Series('', index=logs_df.index)
+        new_values = logs_df['Новое значение'].astype(str) if 'Новое значение' in logs_df.columns else pd.Series('', index=logs_df.index)
+        old_split = old_values.str.split('|', expand=True)
+        new_split = new_values.str.split('|', expand=True)
+        width = max(old_split.shape[1], new_split.shape[1], len(base_cell_names))
+        old_cells = old_split.reindex(columns=range(width)).fillna('').apply(lambda column: column.str.strip())
+        new_cells = new_split.reindex(columns=range(width)).fillna('').apply(lambda column: column.str.strip())
+        # Количество ячеек в таблице каждого лога: не меньше числа колонок листа
+        old_counts = old_values.str.count(r'\|').to_numpy() + 1
+        new_counts = new_values.str.count(r'\|').to_numpy() + 1
+        row_lengths = np.maximum(np.maximum(old_counts, new_counts), len(base_cell_names))
+        # Ячейки, значение которых изменилось, подсвечиваются
+        old_changed = (old_cells != new_cells).to_numpy()
+        new_changed = old_changed.copy()
+        # Если количество ячеек разное (колонку вставили или удалили), сравнение по позициям подсветило бы
+        # все ячейки после вставки: для таких логов выравниваем значения через SequenceMatcher
+        for position in np.flatnonzero(old_counts != new_counts):
+            old_row = old_cells.iloc[position, :old_counts[position]].tolist()
+            new_row = new_cells.iloc[position, :new_counts[position]].tolist()
+            old_changed[position] = False
+            new_changed[position] = False
+            for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(a=old_row, b=new_row, autojunk=False).get_opcodes():
+                if tag != 'equal':
+                    old_changed[position, i1:i2] = True
+                    new_changed[position, j1:j2] = True
 
-            old_cells = [x.strip() for x in old.split('|')]
-            new_cells = [x.strip() for x in new.split('|')]
+        def cells_html(cells, changed, changed_bg):
+            # Ограничиваем длину текста для лучшего отображения
+            display = cells.apply(lambda column: column.where(column.str.len() <= 50, column.str[:50] + '...'))
+            changed_html = (
+                f"<td style='background:{changed_bg};color:#111;padding:8px 12px;font-family:monospace;border:1px solid {border_color};min-width:100px;' title='"
+                + cells + "'>" + display + "</td>"
+            ).to_numpy()
+            same_html = (
+                f"<td style='padding:8px 12px;font-family:monospace;color:{subtext_color};border:1px solid {border_color};min-width:100px;'>"
+                + display + "</td>"
+            ).to_numpy()
+            return np.where(changed, changed_html, same_html)
 
-            max_len = max(len(old_cells), len(new_cells), len(base_cell_names))
-            cell_names = base_cell_names + [''] * (max_len - len(base_cell_names))
-            old_cells += [''] * (max_len - len(old_cells))
-            new_cells += [''] * (max_len - len(new_cells))
+        old_html = cells_html(old_cells, old_changed, old_bg)
+        new_html = cells_html(new_cells, new_changed, new_bg)
 
-            # Создаем таблицу с фиксированной минимальной шириной для ячеек
-            table_html = f"<table style='min-width:100%;width:max-content;border-collapse:collapse;background:{table_bg};color:{text_color};white-space:nowrap;'>"
-            # Первая строка — заголовки
-            table_html += f"<tr><th style='padding:8px 12px;background:{header_bg};color:{subtext_color};border:1px solid {border_color};font-size:0.9em;position:sticky;left:0;z-index:10;min-width:120px;'>{'Тип'}</th>"
-            for name in cell_names:
-                table_html += f"<th style='padding:8px 12px;background:{header_bg};color:{subtext_color};border:1px solid {border_color};font-size:0.9em;min-width:100px;'>{name}</th>"
-            table_html += "</tr>"
-            # Вторая строка — старое значение
-            table_html += "<tr>"
-            table_html += f"<td style='background:{header_bg};color:{subtext_color};font-weight:bold;text-align:right;padding:8px 12px;border:1px solid {border_color};position:sticky;left:0;z-index:5;min-width:120px;'>Старое значение</td>"
-            for i, val in enumerate(old_cells):
-                # Ограничиваем длину текста для лучшего отображения
-                display_val = str(val)[:50] + ('...' if len(str(val)) > 50 else '')
-                if val != new_cells[i]:
-                    table_html += f"<td style='background:{old_bg};color:#111;padding:8px 12px;font-family:monospace;border:1px solid {border_color};min-width:100px;' title='{val}'>{display_val}</td>"
-                else:
-                    table_html += f"<td style='padding:8px 12px;font-family:monospace;color:{subtext_color};border:1px solid {border_color};min-width:100px;'>{display_val}</td>"
-            table_html += "</tr>"
-            # Третья строка — новое значение
-            table_html += "<tr>"
-            table_html += f"<td style='background:{header_bg};color:{subtext_color};font-weight:bold;text-align:right;padding:8px 12px;border:1px solid {border_color};position:sticky;left:0;z-index:5;min-width:120px;'>Новое значение</td>"
-            for i, val in enumerate(new_cells):
-                # Ограничиваем длину текста для лучшего отображения
-                display_val = str(val)[:50] + ('...' if len(str(val)) > 50 else '')
-                if val != old_cells[i]:
-                    table_html += f"<td style='background:{new_bg};color:#111;padding:8px 12px;font-family:monospace;border:1px solid {border_color};min-width:100px;' title='{val}'>{display_val}</td>"
-                else:
-                    table_html += f"<td style='padding:8px 12px;font-family:monospace;color:{subtext_color};border:1px solid {border_color};min-width:100px;'>{display_val}</td>"
-            table_html += "</tr>"
-            table_html += "</table>"
+        # Строка заголовков зависит только от количества ячеек, поэтому собираем ее один раз на каждую ширину
+        header_rows = {}
+        def header_row(length):
+            if length not in header_rows:
+                cell_names = base_cell_names + [''] * (length - len(base_cell_names))
+                header_rows[length] = (
+                    f"<tr><th style='padding:8px 12px;background:{header_bg};color:{subtext_color};border:1px solid {border_color};font-size:0.9em;position:sticky;left:0;z-index:10;min-width:120px;'>{'Тип'}</th>"
+                    + ''.join(
+                        f"<th style='padding:8px 12px;background:{header_bg};color:{subtext_color};border:1px solid {border_color};font-size:0.9em;min-width:100px;'>{name}</th>"
+                        for name in cell_names
+                    )
+                    + "</tr>"
+                )
+            return header_rows[length]
+
+        old_label = f"<td style='background:{header_bg};color:{subtext_color};font-weight:bold;text-align:right;padding:8px 12px;border:1px solid {border_color};position:sticky;left:0;z-index:5;min-width:120px;'>Старое значение</td>"
+        new_label = f"<td style='background:{header_bg};color:{subtext_color};font-weight:bold;text-align:right;padding:8px 12px;border:1px solid {border_color};position:sticky;left:0;z-index:5;min-width:120px;'>Новое значение</td>"
+
+        # Преобразуем даты к формату 'дд.мм.гггг чч:мм' для всех логов сразу; нераспознанные оставляем как есть
+        if 'Дата' in logs_df.columns:
+            dates = pd.to_datetime(logs_df['Дата'], errors='coerce').dt.strftime('%d.%m.%Y %H:%M').fillna(logs_df['Дата'].astype(str))
+        else:
+            dates = pd.Series('', index=logs_df.index)
+
+        # Все карточки собираем в одну строку и выводим одним вызовом st.markdown
+        # Берем нужные колонки целиком, без построения Series на каждую строку как в iterrows
+        users = logs_df['Пользователь'].tolist() if 'Пользователь' in logs_df.columns else [''] * len(logs_df)
+        cell_refs = logs_df['Ячейка'].tolist() if 'Ячейка' in logs_df.columns else [''] * len(logs_df)
+
+        cards = []
+        for position, (date, user, cell) in enumerate(zip(dates.tolist(), users, cell_refs)):
+            length = row_lengths[position]
+
+            # Таблица: заголовки, старое значение, новое значение
+            table_html = (
+                f"<table style='min-width:100%;width:max-content;border-collapse:collapse;background:{table_bg};color:{text_color};white-space:nowrap;'>"
+                + header_row(length)
+                + "<tr>" + old_label + ''.join(old_html[position, :length]) + "</tr>"
+                + "<tr>" + new_label + ''.join(new_html[position, :length]) + "</tr>"
+                + "</table>"
+            )
+
+            cards.append(
+                f"<div style='background:{card_bg};padding:1.2em 1.5em;margin-bottom:2em;border-radius:10px;border:2px solid {card_border};box-shadow:0 2px 4px rgba(0,0,0,0.1);'>"
+                f"<div style='color:{subtext_color};font-size:0.95em;margin-bottom:1em;padding-bottom:0.5em;border-bottom:1px solid {border_color};'>🕒 <b>{date}</b> &nbsp; 👤 <b>{user}</b> &nbsp; <span style='color:{subtext_color}'>Ячейка:</span> <b>{cell}</b></div>"
+                f"<div class='log-table-container' style='overflow-x:auto;overflow-y:visible;width:100%;max-width:100%;border:1px solid {border_color};border-radius:5px;'>"
+                f"{table_html}"
+                "</div></div>"
+            )
 
-            st.markdown(f"""
-            <div style='background:{card_bg};padding:1.2em 1.5em;margin-bottom:2em;border-radius:10px;border:2px solid {card_border};box-shadow:0 2px 4px rgba(0,0,0,0.1);'>
-                <div style='color:{subtext_color};font-size:0.95em;margin-bottom:1em;padding-bottom:0.5em;border-bottom:1px solid {border_color};'>🕒 <b>{date}</b> &nbsp; 👤 <b>{user}</b> &nbsp; <span style='color:{subtext_color}'>Ячейка:</span> <b>{cell}</b></div>
-                <div class='log-table-container' style='overflow-x:auto;overflow-y:visible;width:100%;max-width:100%;border:1px solid {border_color};border-radius:5px;'>
-                    {table_html}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+        st.markdown(''.join(cards), unsafe_allow_html=True)
     except Exception as e:
         st.error(f"Ошибка при загрузке логов: {str(e)}")
 